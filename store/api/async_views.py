@@ -0,0 +1,85 @@
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.exceptions import APIException, NotFound, Throttled
+
+from api import views
+from api.pagination import KeysetPagination
+from api.renderers import FastJSONRenderer
+from main.caching import PRODUCTS_VERSION, COMMENTS_VERSION
+from main.conditional import aconditional
+from main.facets import filter_products
+from main.loaders import aload_product_detail
+from main.models import Product, Comment
+from main.throttling import consume, get_client_ip
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def async_read(sync_view):
+    """Асинхронная обработка GET и HEAD.
+
+    Остальные методы передаются синхронному контроллеру DRF, который
+    выполняет аутентификацию, проверку прав и CSRF-токена. Аутентификация
+    при чтении не выполняется, поэтому ко всем запросам применяется
+    ограничение guest по IP-адресу: наличие заголовка Authorization или
+    cookie сессии ничего не говорит о том, что они действительны.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            try:
+                wait = consume('guest', f'ip:{get_client_ip(request)}')
+                if wait is not None:
+                    raise Throttled(wait)
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                response = json_response({'detail': exc.detail}, exc.status_code)
+                if getattr(exc, 'wait', None):
+                    response['Retry-After'] = math.ceil(exc.wait)
+                return response
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def list_response(request, queryset, values_serializer, limit=None):
+    """Асинхронный вариант api.views.list_response, записи выбираются через .values()"""
+    paginator = KeysetPagination()
+    queryset = values_serializer.get_queryset(queryset, *paginator.ordering_fields())
+    page = await paginator.apaginate_queryset(queryset, request)
+    if page is not None:
+        return json_response(paginator.get_paginated_data(values_serializer.to_representation_list(page)))
+    if limit is not None:
+        queryset = queryset[:limit]
+    return json_response(values_serializer.to_representation_list([row async for row in queryset]))
+
+
+@async_read(views.products)
+@aconditional(PRODUCTS_VERSION)
+async def products(request):
+    products, selection = views.catalog_products(request.GET)
+    return await list_response(request, filter_products(products, selection), views.product_values, limit=20)
+
+
+@async_read(views.ProductDetailView.as_view())
+@aconditional(PRODUCTS_VERSION)
+async def product_detail(request, pk):
+    try:
+        detail = await aload_product_detail(pk, **views.product_detail_options())
+    except Product.DoesNotExist:
+        raise NotFound()
+    return json_response(views.product_detail_data(detail, request))
+
+
+@async_read(views.comments)
+@aconditional(PRODUCTS_VERSION, COMMENTS_VERSION)
+async def comments(request, pk):
+    comments = Comment.objects.filter(is_active=True, product=pk)
+    return await list_response(request, comments, views.comment_values)
@@ -0,0 +1,130 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, BasicAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from main.caching import get_version, bump_version
+
+
+def user_version_name(pk):
+    return f'user:{pk}'
+
+
+def get_cached_user(pk):
+    """Пользователь из кэша, None, если такого пользователя нет.
+
+    Запись в кэше привязана к версии пользователя, которая меняется при
+    каждом сохранении и удалении пользователя, поэтому после смены пароля
+    или деактивации запись больше не читается. При AUTH_CACHE_TIMEOUT = 0
+    пользователь всегда читается из БД.
+    """
+    if not settings.AUTH_CACHE_TIMEOUT:
+        return get_user_model()._default_manager.filter(pk=pk).first()
+    key = f'auth:user:{pk}:{get_version(user_version_name(pk))}'
+    user = cache.get(key)
+    if user is None:
+        user = get_user_model()._default_manager.filter(pk=pk).first()
+        if user is None:
+            return None
+        cache.set(key, user, settings.AUTH_CACHE_TIMEOUT)
+    return user
+
+
+def digest(*values):
+    """Ключ кэша для секретных данных, сами данные в кэше не хранятся"""
+    message = '\0'.join(values).encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def token_cache_key(key):
+    return f'auth:token:{digest(key)}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену без обращения к БД для токенов, найденных в кэше"""
+    def authenticate_credentials(self, key):
+        if not settings.AUTH_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            cached = self.get_model().objects.filter(key=key).values_list('user_id', 'created').first()
+            if cached is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            cache.set(cache_key, cached, settings.AUTH_CACHE_TIMEOUT)
+        user_pk, created = cached
+        # Пользователь читается отдельно, чтобы его запись в кэше соответствовала версии
+        user = get_cached_user(user_pk)
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        token = self.get_model()(key=key, user=user, created=created)
+        return user, token
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """Базовая аутентификация, запоминающая успешно проверенные имя и пароль.
+
+    Хеширование пароля выполняется только при первом запросе и после
+    истечения AUTH_BASIC_CACHE_TIMEOUT. Вместе с пользователем запоминается
+    хеш его пароля: после смены пароля хеши не совпадают, и запись не
+    используется.
+    """
+    def authenticate_credentials(self, userid, password, request=None):
+        if not settings.AUTH_BASIC_CACHE_TIMEOUT:
+            return super().authenticate_credentials(userid, password, request)
+        cache_key = f'auth:basic:{digest(userid, password)}'
+        cached = cache.get(cache_key)
+        if cached is not None:
+            user_pk, password_hash = cached
+            user = get_cached_user(user_pk)
+            if user is not None and user.is_active and user.password == password_hash:
+                return user, None
+        user, auth = super().authenticate_credentials(userid, password, request)
+        cache.set(cache_key, (user.pk, user.password), settings.AUTH_BASIC_CACHE_TIMEOUT)
+        return user, auth
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """Аутентификация по JWT с получением пользователя из кэша"""
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        if api_settings.USER_ID_FIELD != self.user_model._meta.pk.name:
+            return super().get_user(validated_token)
+        user = get_cached_user(user_id)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+def user_changed_dispatcher(sender, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    # Время последнего входа не влияет на аутентификацию
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_version(user_version_name(kwargs['instance'].pk))
+
+
+def token_deleted_dispatcher(sender, **kwargs):
+    key = token_cache_key(kwargs['instance'].key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+post_save.connect(user_changed_dispatcher, sender=settings.AUTH_USER_MODEL)
+post_delete.connect(user_changed_dispatcher, sender=settings.AUTH_USER_MODEL)
+post_delete.connect(token_deleted_dispatcher, sender=Token)
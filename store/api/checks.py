@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Warning, register, Tags
+
+from main.checks import is_process_local
+
+
+@register(Tags.caches)
+def auth_cache_check(app_configs, **kwargs):
+    """Кэширование аутентификации требует общего для всех процессов кэша"""
+    if (settings.AUTH_CACHE_TIMEOUT or settings.AUTH_BASIC_CACHE_TIMEOUT) and is_process_local():
+        return [Warning(
+            'Пользователи и токены API кэшируются в памяти процесса',
+            hint='Смена пароля, деактивация пользователя и отзыв токена не сбрасывают записи в других '
+                 'процессах. Задайте CACHE_URL с общим кэшем (Redis, Memcached) или '
+                 'AUTH_CACHE_TIMEOUT=0 и AUTH_BASIC_CACHE_TIMEOUT=0.',
+            id='api.W001',
+        )]
+    return []
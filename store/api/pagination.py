@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from main.pagination import KeysetPaginator
+
+
+class KeysetPagination(BasePagination):
+    """Постраничный вывод по курсору (created_at, id), включается параметром cursor"""
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return None
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.page_size, self.ordering)
+        try:
+            self.page = paginator.page(request.query_params[self.cursor_query_param])
+        except InvalidPage as e:
+            raise NotFound(str(e))
+        return list(self.page)
+
+    def ordering_fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    async def apaginate_queryset(self, queryset, request):
+        """Вариант paginate_queryset для асинхронных контроллеров, request - запрос Django"""
+        if self.cursor_query_param not in request.GET:
+            return None
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.page_size, self.ordering)
+        try:
+            self.page = await paginator.apage(request.GET[self.cursor_query_param])
+        except InvalidPage as e:
+            raise NotFound(str(e))
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.get_link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self.get_link(self.page.previous_cursor)
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
@@ -0,0 +1,27 @@
+from functools import lru_cache
+
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+
+@lru_cache(maxsize=None)
+def get_encoder(encoder_class, ensure_ascii, allow_nan, separators):
+    return encoder_class(ensure_ascii=ensure_ascii, allow_nan=allow_nan, separators=separators)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer, использующий один кодировщик на процесс для вывода без отступов.
+
+    Результат побайтно совпадает с JSONRenderer.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        encoder = get_encoder(
+            self.encoder_class, self.ensure_ascii, not self.strict,
+            SHORT_SEPARATORS if self.compact else LONG_SEPARATORS,
+        )
+        ret = encoder.encode(data)
+        return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
@@ -1,3 +1,5 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
 from rest_framework import serializers
 
 from main.models import Product, Comment, Category
@@ -21,7 +23,91 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'content', 'price', 'created_at', 'seller', 'manufacturer', 'image')
 
 
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, берущий записи из словаря context['preloaded'][имя поля], если он передан.
+
+    Словарь заполняется одним запросом in_bulk, поэтому при проверке списка
+    записей связанные записи не выбираются по одной.
+    """
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded', {}).get(self.field_name)
+        if preloaded is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            obj = preloaded.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
 class CommentSerializer(serializers.ModelSerializer):
+    product = PreloadedPrimaryKeyRelatedField(queryset=Product.objects.all())
+
     class Meta:
         model = Comment
         fields = ('product', 'author', 'content', 'created_at')
+
+
+class ValuesSerializer:
+    """Вывод строк .values() в том же виде, что и у сериализатора модели.
+
+    Преобразователи полей составляются один раз по полям сериализатора,
+    поэтому экземпляры моделей и полей DRF для каждой записи не создаются.
+    Поддерживаются только используемые в API типы полей.
+    """
+    def __init__(self, serializer_class):
+        self.model = serializer_class.Meta.model
+        self.names = []
+        self.columns = []
+        self.converters = []
+        for name, field in serializer_class().fields.items():
+            model_field = self.model._meta.get_field(field.source)
+            self.names.append(name)
+            self.columns.append(model_field.attname)
+            self.converters.append(self.get_converter(field, model_field))
+
+    def get_converter(self, field, model_field):
+        """Функция (значение, запрос) -> представление, None если значение выводится как есть"""
+        if isinstance(field, serializers.DateTimeField):
+            return self.convert_datetime
+        if isinstance(field, serializers.FileField):
+            storage = model_field.storage
+
+            def convert_file(value, request):
+                if not value:
+                    return None
+                url = storage.url(value)
+                return request.build_absolute_uri(url) if request is not None else url
+            return convert_file
+        if isinstance(field, serializers.FloatField):
+            return lambda value, request: float(value)
+        if isinstance(field, (serializers.IntegerField, serializers.CharField, serializers.BooleanField,
+                              serializers.PrimaryKeyRelatedField)):
+            return None
+        raise ImproperlyConfigured(f'{type(field).__name__} не поддерживается {type(self).__name__}')
+
+    @staticmethod
+    def convert_datetime(value, request):
+        if value is None:
+            return None
+        value = value.astimezone(timezone.get_current_timezone()).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    def get_queryset(self, queryset, *extra):
+        """Строки с полями сериализатора и дополнительными полями (например, для курсора)"""
+        return queryset.values(*dict.fromkeys(self.columns + list(extra)))
+
+    def to_representation(self, row, request=None):
+        return {
+            name: value if convert is None else convert(value, request)
+            for name, convert, value in zip(self.names, self.converters, map(row.__getitem__, self.columns))
+        }
+
+    def to_representation_list(self, rows, request=None):
+        return [self.to_representation(row, request) for row in rows]
@@ -1,3 +1,283 @@
-from django.test import TestCase
+import base64
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, RequestFactory, AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from api import views, async_views
+from api.checks import auth_cache_check
+from api.renderers import FastJSONRenderer
+from api.serializers import ProductSerializer, ProductDetailSerializer, CommentSerializer, ValuesSerializer
+from main.models import AdvUser, SuperCategory, SubCategory, Product, Comment, OutgoingEmail
+
+
+class CatalogTestCase(TestCase):
+    """Товары с текстом, требующим экранирования в JSON, изображением и комментариями"""
+    @classmethod
+    def setUpTestData(cls):
+        super_category = SuperCategory.objects.create(name='Техника', order=1)
+        category = SubCategory.objects.create(name='Телефоны', order=2, super_category=super_category)
+        seller = AdvUser.objects.create_user('seller', 'seller@example.com', 'password')
+        cls.products = [
+            Product.objects.create(
+                category=category, seller=seller, title=f'Телефон «{i}»', manufacturer='Nokia',
+                content='Описание\nс "кавычками", \\ и \u2028 разделителем', price=i * 10.5 + 0.1,
+            )
+            for i in range(5)
+        ]
+        Product.objects.filter(pk=cls.products[0].pk).update(image='phone.jpg')
+        for product in cls.products[:2]:
+            for i in range(3):
+                Comment.objects.create(product=product, author='Гость', content=f'Комментарий {i} 😀')
+
+    def setUp(self):
+        # Курсор подписывается с отметкой времени в секундах: сравниваемые ответы,
+        # построенные на границе секунды, иначе содержали бы разные курсоры
+        patcher = mock.patch.object(signing.TimestampSigner, 'timestamp', return_value=signing.b62_encode(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class FastSerializationTests(CatalogTestCase):
+    """Вывод через .values() побайтно совпадает с выводом сериализаторов моделей"""
+
+    def get_both(self, url, **kwargs):
+        responses = []
+        for fast in (False, True):
+            with override_settings(API_FAST_SERIALIZATION=fast):
+                responses.append(self.client.get(url, **kwargs))
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+        return responses
+
+    def assertSameOutput(self, url, **kwargs):
+        slow, fast = self.get_both(url, **kwargs)
+        self.assertEqual(slow.content, fast.content)
+        return slow
+
+    def test_products(self):
+        self.assertSameOutput('/api/products/')
+
+    def test_products_cursor(self):
+        response = self.assertSameOutput('/api/products/?cursor=')
+        next_url = response.json()['next']
+        while next_url:
+            response = self.assertSameOutput(next_url)
+            next_url = response.json()['next']
+
+    def test_product_detail(self):
+        for product in self.products[:2]:
+            self.assertSameOutput(f'/api/products/{product.pk}')
+
+    def test_product_detail_not_found(self):
+        Product.objects.filter(pk=self.products[1].pk).update(is_active=False)
+        for fast in (False, True):
+            with override_settings(API_FAST_SERIALIZATION=fast):
+                self.assertEqual(self.client.get(f'/api/products/{self.products[1].pk}').status_code, 404)
+
+    def test_comments(self):
+        product = self.products[0]
+        self.assertSameOutput(f'/api/products/{product.pk}/comments/')
+        response = self.assertSameOutput(f'/api/products/{product.pk}/comments/?cursor=')
+        self.assertSameOutput(response.json()['next'])
+
+    def test_serializers_in_other_timezone(self):
+        cases = (
+            (ProductSerializer, Product.objects.all()),
+            (ProductDetailSerializer, Product.objects.all()),
+            (CommentSerializer, Comment.objects.all()),
+        )
+        with timezone.override('Europe/Moscow'):
+            for serializer_class, queryset in cases:
+                values = ValuesSerializer(serializer_class)
+                fast = values.to_representation_list(values.get_queryset(queryset))
+                self.assertEqual(fast, serializer_class(queryset, many=True).data)
+
+    def test_renderer(self):
+        data = ProductDetailSerializer(Product.objects.all(), many=True).data
+        for accepted_media_type in (None, 'application/json', 'application/json; indent=4'):
+            self.assertEqual(
+                FastJSONRenderer().render(data, accepted_media_type, {}),
+                JSONRenderer().render(data, accepted_media_type, {}),
+            )
+
+
+class AsyncViewsTests(CatalogTestCase):
+    """Асинхронные контроллеры отдают то же, что и синхронные"""
+    async def assertSameOutput(self, sync_view, async_view, path, **kwargs):
+        sync_response = await sync_to_async(sync_view)(RequestFactory().get(path), **kwargs)
+        sync_response.render()
+        async_response = await async_view(AsyncRequestFactory().get(path), **kwargs)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+        self.assertEqual(async_response['ETag'], sync_response['ETag'])
+        return async_response
+
+    async def test_products(self):
+        await self.assertSameOutput(views.products, async_views.products, '/api/products/')
+        response = await self.assertSameOutput(views.products, async_views.products, '/api/products/?cursor=')
+        await self.assertSameOutput(views.products, async_views.products, json.loads(response.content)['next'])
+
+    async def test_product_detail(self):
+        for product in self.products[:2]:
+            await self.assertSameOutput(
+                views.ProductDetailView.as_view(), async_views.product_detail, '/api/products/', pk=product.pk
+            )
+
+    async def test_product_detail_not_found(self):
+        response = await async_views.product_detail(AsyncRequestFactory().get('/api/products/'), pk=0)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_comments(self):
+        pk = self.products[0].pk
+        await self.assertSameOutput(views.comments, async_views.comments, '/api/products/', pk=pk)
+        await self.assertSameOutput(views.comments, async_views.comments, '/api/products/?cursor=', pk=pk)
+
+
+class FacetsTests(CatalogTestCase):
+    def test_counts_ignore_own_facet(self):
+        Product.objects.filter(pk=self.products[4].pk).update(manufacturer='Siemens', price=2000)
+        category = self.products[0].category_id
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/facets/', {'category': category, 'manufacturer': 'Nokia'})
+        facets = response.json()
+        self.assertEqual(facets['count'], 4)
+        self.assertEqual(
+            [(facet['value'], facet['count'], facet['selected']) for facet in facets['manufacturer']],
+            [('Nokia', 4, True), ('Siemens', 1, False)],
+        )
+        self.assertEqual([facet['count'] for facet in facets['price']], [4, 0, 0, 0])
+
+
+class BatchTests(CatalogTestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+
+    def test_products_batch(self):
+        first, second = self.products[3], self.products[1]
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/batch', {'ids': f'{first.pk},0,{second.pk},{first.pk}'})
+        self.assertEqual(response.status_code, 200)
+        expected = ProductDetailSerializer([first, second], many=True, context={'request': response.wsgi_request})
+        self.assertEqual(response.json(), json.loads(JSONRenderer().render(expected.data)))
+        with override_settings(API_FAST_SERIALIZATION=True):
+            self.assertEqual(self.client.get('/api/products/batch', {'ids': f'{first.pk},{second.pk}'}).json(),
+                             response.json())
+        self.assertEqual(self.client.get('/api/products/batch', {'ids': 'a'}).status_code, 400)
+
+    @override_settings(THROTTLE_RATES={'comment': '10/m'})
+    def test_comments_batch(self):
+        seller = AdvUser.objects.get(username='seller')
+        self.client.force_login(seller)
+        data = [
+            {'product': product.pk, 'author': 'seller', 'content': f'Пакет {i}'}
+            for i, product in enumerate([self.products[2], self.products[2], self.products[3]])
+        ]
+        response = self.client.post('/api/comments/batch/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 3)
+        self.assertEqual(Product.objects.get(pk=self.products[2].pk).comment_count, 2)
+        self.assertEqual(OutgoingEmail.objects.filter(dedup_key__startswith='comments:').count(), 1)
+        data[1]['product'] = 0
+        response = self.client.post('/api/comments/batch/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(THROTTLE_RATES={'comment': '2/m'})
+    def test_comments_batch_larger_than_bucket(self):
+        self.client.force_login(AdvUser.objects.get(username='seller'))
+        data = [{'product': self.products[0].pk, 'author': 'seller', 'content': f'Пакет {i}'} for i in range(3)]
+        for _ in range(2):
+            response = self.client.post('/api/comments/batch/', data, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/comments/batch/', data[:2], content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+
+@override_settings(THROTTLE_RATES={'comment': '2/m', 'guest': '3/m', 'user': ''})
+class ThrottleTests(CatalogTestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+
+    def test_comment_bucket(self):
+        user = AdvUser.objects.get(username='seller')
+        self.client.force_login(user)
+        url = f'/api/products/{self.products[0].pk}/comments/'
+        data = {'product': self.products[0].pk, 'author': 'seller', 'content': 'Текст'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, data).status_code, 201)
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    async def test_async_read_ignores_credentials(self):
+        request_factory = AsyncRequestFactory(HTTP_AUTHORIZATION='x')
+        statuses = [(await async_views.products(request_factory.get('/api/products/'))).status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_guest_bucket(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/products/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/products/').status_code, 429)
+
+
+@override_settings(AUTH_CACHE_TIMEOUT=300, AUTH_BASIC_CACHE_TIMEOUT=60)
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = AdvUser.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.token = Token.objects.create(user=self.user)
+
+    def get(self, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/categories/', **kwargs)
+        auth_queries = [query for query in queries if 'authtoken' in query['sql'] or 'main_advuser' in query['sql']]
+        return response.status_code, len(auth_queries)
+
+    def test_token_cached(self):
+        header = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        self.assertEqual(self.get(**header), (200, 2))
+        self.assertEqual(self.get(**header), (200, 0))
+
+    def test_token_revoked(self):
+        header = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        self.get(**header)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.get(**header)[0], 401)
+
+    def test_deactivated_user(self):
+        header = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        self.get(**header)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.get(**header)[0], 401)
+
+    def test_local_cache_check(self):
+        self.assertEqual([warning.id for warning in auth_cache_check(None)], ['api.W001'])
+        with override_settings(AUTH_CACHE_TIMEOUT=0, AUTH_BASIC_CACHE_TIMEOUT=0):
+            self.assertEqual(auth_cache_check(None), [])
+            header = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+            # Токен и пользователь читаются одним запросом при каждой аутентификации
+            self.assertEqual(self.get(**header), (200, 1))
+            self.assertEqual(self.get(**header), (200, 1))
+
+    def test_basic_password_changed(self):
+        header = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'buyer:password').decode()}
+        for _ in range(2):
+            self.assertEqual(self.get(**header)[0], 200)
+        self.assertEqual(self.get(**header), (200, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('changed')
+            self.user.save()
+        self.assertEqual(self.get(**header)[0], 401)
@@ -0,0 +1,73 @@
+from rest_framework.throttling import BaseThrottle
+
+from main.throttling import consume, get_capacity, get_client_ip
+
+
+class BucketThrottle(BaseThrottle):
+    """Ограничение DRF на ведрах токенов main.throttling, ведра задаются в settings.THROTTLE_RATES"""
+    scope = None
+
+    def get_idents(self, request):
+        """Ведра, из которых списывается токен, по порядку проверки"""
+        raise NotImplementedError('.get_idents() must be overridden')
+
+    def get_tokens(self, request):
+        """Число списываемых токенов, 0 - запрос не ограничивается (его отклоняет контроллер)"""
+        return 1
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        tokens = self.get_tokens(request)
+        if not tokens:
+            return True
+        for ident in self.get_idents(request):
+            self.wait_time = consume(self.scope, ident, tokens)
+            if self.wait_time is not None:
+                return False
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class GuestThrottle(BucketThrottle):
+    """Запросы гостей по IP-адресу"""
+    scope = 'guest'
+
+    def get_idents(self, request):
+        if request.user.is_authenticated:
+            return []
+        return [f'ip:{get_client_ip(request)}']
+
+
+class UserThrottle(BucketThrottle):
+    """Запросы вошедших пользователей"""
+    scope = 'user'
+
+    def get_idents(self, request):
+        if not request.user.is_authenticated:
+            return []
+        return [f'user:{request.user.pk}']
+
+
+class CommentThrottle(BucketThrottle):
+    """Добавление комментариев по IP-адресу и пользователю, как в main.throttling.throttle"""
+    scope = 'comment'
+
+    def get_idents(self, request):
+        if request.method != 'POST':
+            return []
+        idents = [f'ip:{get_client_ip(request)}']
+        if request.user.is_authenticated:
+            idents.append(f'user:{request.user.pk}')
+        return idents
+
+    def get_tokens(self, request):
+        # Каждый комментарий пакета расходует свой токен. Пакет больше ведра не пройдет
+        # никогда, его отклоняет comments_batch с кодом 400 без списания токенов
+        if not isinstance(request.data, list) or not request.data:
+            return 1
+        capacity = get_capacity(self.scope)
+        if capacity is not None and len(request.data) > capacity:
+            return 0
+        return len(request.data)
@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 
-from api.views import products, ProductDetailView, comments, APICategoryViewSet
+from api import async_views
+from api.views import products, ProductDetailView, comments, facets, products_batch, comments_batch, \
+    APICategoryViewSet
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView, TokenVerifyView,
@@ -9,10 +12,24 @@ from rest_framework_simplejwt.views import (
 router = DefaultRouter()
 router.register('categories', APICategoryViewSet)
 
-urlpatterns = [
-    path('products/<int:pk>/comments/', comments),
-    path('products/<int:pk>', ProductDetailView.as_view()),
-    path('products/', products),
+if settings.API_ASYNC_VIEWS:
+    # Асинхронные контроллеры для развертывания через ASGI
+    product_urls = [
+        path('products/<int:pk>/comments/', async_views.comments, name='api_comments'),
+        path('products/<int:pk>', async_views.product_detail, name='api_product_detail'),
+        path('products/', async_views.products, name='api_products'),
+    ]
+else:
+    product_urls = [
+        path('products/<int:pk>/comments/', comments, name='api_comments'),
+        path('products/<int:pk>', ProductDetailView.as_view(), name='api_product_detail'),
+        path('products/', products, name='api_products'),
+    ]
+
+urlpatterns = product_urls + [
+    path('products/facets/', facets, name='api_facets'),
+    path('products/batch', products_batch, name='api_products_batch'),
+    path('comments/batch/', comments_batch, name='api_comments_batch'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),  # JWT authentication
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
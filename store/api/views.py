@@ -1,37 +1,171 @@
+from collections import OrderedDict
+
+from django.conf import settings
 from django.contrib.admin import action
+from django.db import transaction
 from django.shortcuts import render
-from rest_framework.decorators import api_view, permission_classes
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.generics import RetrieveAPIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
 from rest_framework.status import HTTP_201_CREATED, HTTP_400_BAD_REQUEST
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.viewsets import ModelViewSet
 
-from api.serializers import ProductSerializer, ProductDetailSerializer, CommentSerializer, CategorySerializer
+from api.pagination import KeysetPagination
+from api.serializers import ProductSerializer, ProductDetailSerializer, CommentSerializer, CategorySerializer, \
+    ValuesSerializer
+from api.throttling import GuestThrottle, UserThrottle, CommentThrottle
+from main.apps import comments_bulk_created
+from main.caching import PRODUCTS_VERSION, COMMENTS_VERSION, CATEGORIES_VERSION
+from main.conditional import conditional
+from main.facets import FacetSelection, filter_products, get_facets
+from main.loaders import load_product_detail
 from main.models import Product, Comment, Category
+from main.throttling import get_capacity
 
 
+@method_decorator(conditional(CATEGORIES_VERSION), name='list')
+@method_decorator(conditional(CATEGORIES_VERSION), name='retrieve')
 class APICategoryViewSet(ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = (IsAuthenticated,)
 
 
+product_values = ValuesSerializer(ProductSerializer)
+product_detail_values = ValuesSerializer(ProductDetailSerializer)
+comment_values = ValuesSerializer(CommentSerializer)
+
+MAX_BATCH_SIZE = 100
+
+
+def list_response(request, queryset, serializer_class, values_serializer, limit=None):
+    """Список с постраничным выводом по курсору.
+
+    При settings.API_FAST_SERIALIZATION записи выбираются через .values() и
+    выводятся values_serializer без создания экземпляров моделей.
+    """
+    paginator = KeysetPagination()
+    if settings.API_FAST_SERIALIZATION:
+        queryset = values_serializer.get_queryset(queryset, *paginator.ordering_fields())
+        serialize = values_serializer.to_representation_list
+    else:
+        serialize = lambda objects: serializer_class(objects, many=True).data
+    page = paginator.paginate_queryset(queryset, request)
+    if page is not None:
+        return paginator.get_paginated_response(serialize(page))
+    if limit is not None:
+        queryset = queryset[:limit]
+    return Response(serialize(queryset))
+
+
+def catalog_products(params):
+    """Активные товары категории из параметра category и выбранные значения фасетов"""
+    products = Product.objects.filter(is_active=True)
+    if params.get('category'):
+        try:
+            products = products.filter(category=int(params['category']))
+        except ValueError:
+            raise ValidationError({'category': 'Неверный идентификатор категории'})
+    return products, FacetSelection.from_params(params)
+
+
 @api_view(['GET'])
+@conditional(PRODUCTS_VERSION)
 def products(request):
     if request.method == 'GET':
-        products = Product.objects.filter(is_active=True)[:20]
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        products, selection = catalog_products(request.GET)
+        products = filter_products(products, selection)
+        return list_response(request, products, ProductSerializer, product_values, limit=20)
+
+
+def batch_ids(request):
+    """Идентификаторы из параметра ids (через запятую или повторением параметра) без повторов"""
+    values = [value for param in request.GET.getlist('ids') for value in param.split(',') if value.strip()]
+    try:
+        ids = list(dict.fromkeys(int(value) for value in values))
+    except ValueError:
+        raise ValidationError({'ids': 'Ожидаются целые числа через запятую'})
+    if not ids:
+        raise ValidationError({'ids': 'Не заданы товары'})
+    if len(ids) > MAX_BATCH_SIZE:
+        raise ValidationError({'ids': f'Не более {MAX_BATCH_SIZE} товаров за запрос'})
+    return ids
+
+
+@api_view(['GET'])
+@conditional(PRODUCTS_VERSION)
+def products_batch(request):
+    """Несколько товаров одним запросом в порядке параметра ids, отсутствующие товары пропускаются"""
+    ids = batch_ids(request)
+    products = Product.objects.filter(is_active=True)
+    if settings.API_FAST_SERIALIZATION:
+        # in_bulk не работает со строками .values()
+        rows = {row['id']: row for row in product_detail_values.get_queryset(products, 'id').filter(pk__in=ids)}
+        return Response([product_detail_values.to_representation(rows[pk], request) for pk in ids if pk in rows])
+    found = products.in_bulk(ids)
+    products = [found[pk] for pk in ids if pk in found]
+    return Response(ProductDetailSerializer(products, many=True, context={'request': request}).data)
+
+
+@api_view(['GET'])
+@conditional(PRODUCTS_VERSION)
+def facets(request):
+    """Число товаров по производителям и диапазонам цен с учетом выбранных фасетов"""
+    products, selection = catalog_products(request.GET)
+    return Response(get_facets(products, selection))
 
 
+@method_decorator(conditional(PRODUCTS_VERSION), name='get')
 class ProductDetailView(RetrieveAPIView):
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductDetailSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            detail = load_product_detail(kwargs['pk'], **product_detail_options())
+        except Product.DoesNotExist:
+            raise NotFound()
+        return Response(product_detail_data(detail, request))
+
+
+def product_detail_options():
+    """Параметры загрузки товара для API: строки .values() при settings.API_FAST_SERIALIZATION"""
+    options = {'per_page': KeysetPagination.page_size}
+    if settings.API_FAST_SERIALIZATION:
+        options['product_fields'] = product_detail_values.columns
+        options['comment_fields'] = comment_values.columns
+    return options
+
+
+def product_detail_data(detail, request):
+    """Товар с адресами дополнительных изображений и первой страницей комментариев.
+
+    Следующие страницы комментариев выдаются по ссылке next контроллером comments.
+    """
+    if settings.API_FAST_SERIALIZATION:
+        data = product_detail_values.to_representation(detail.product, request)
+        comments = comment_values.to_representation_list(detail.comments, request)
+    else:
+        data = ProductDetailSerializer(detail.product, context={'request': request}).data
+        comments = CommentSerializer(detail.comments, many=True).data
+    data['images'] = [request.build_absolute_uri(image.image.url) for image in detail.images]
+    next_link = None
+    if detail.comments.has_next():
+        url = request.build_absolute_uri(reverse('api_comments', kwargs={'pk': data['id']}))
+        next_link = replace_query_param(url, 'cursor', detail.comments.next_cursor)
+    data['comments'] = OrderedDict([('next', next_link), ('results', comments)])
+    return data
+
 
 @api_view(['GET', 'POST'])
 @permission_classes((IsAuthenticatedOrReadOnly,))
+@throttle_classes((GuestThrottle, UserThrottle, CommentThrottle))
+@conditional(PRODUCTS_VERSION, COMMENTS_VERSION)
 def comments(request, pk):
     if request.method == 'POST':
         serializer = CommentSerializer(data=request.data)
@@ -42,5 +176,33 @@ def comments(request, pk):
             return Response(serializer.errors, status=HTTP_400_BAD_REQUEST)
     else:
         comments = Comment.objects.filter(is_active=True, product=pk)
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return list_response(request, comments, CommentSerializer, comment_values)
+
+
+@api_view(['POST'])
+@permission_classes((IsAuthenticated,))
+@throttle_classes((GuestThrottle, UserThrottle, CommentThrottle))
+def comments_batch(request):
+    """Добавление списка комментариев одним запросом INSERT.
+
+    Товары для проверки выбираются одним запросом, продавцам отправляется
+    по одному письму обо всех их новых комментариях.
+    """
+    if not isinstance(request.data, list) or not request.data:
+        raise ValidationError({'non_field_errors': ['Ожидается непустой список комментариев']})
+    max_size = min(MAX_BATCH_SIZE, get_capacity('comment') or MAX_BATCH_SIZE)
+    if len(request.data) > max_size:
+        raise ValidationError({'non_field_errors': [f'Не более {max_size} комментариев за запрос']})
+    pks = set()
+    for item in request.data:
+        try:
+            pks.add(int(item['product']))
+        except (TypeError, KeyError, ValueError):
+            pass
+    context = {'preloaded': {'product': Product.objects.in_bulk(pks)}}
+    serializer = CommentSerializer(data=request.data, many=True, context=context)
+    serializer.is_valid(raise_exception=True)
+    with transaction.atomic():
+        comments = Comment.objects.bulk_create(Comment(**data) for data in serializer.validated_data)
+        comments_bulk_created.send(sender=Comment, comments=comments)
+    return Response(CommentSerializer(comments, many=True).data, status=HTTP_201_CREATED)
@@ -1,17 +1,52 @@
 import datetime
-
-from django.contrib import admin
-from .models import AdvUser, SubCategory, SuperCategory, AdditionalImage, Product, Comment
-from .utilites import send_activation_notification
+from itertools import islice
+
+from django.contrib import admin, messages
+from .models import AdvUser, SubCategory, SuperCategory, AdditionalImage, Product, Comment, OutgoingEmail
+from .deletion import delete_products, delete_user
+from .outbox import enqueue_emails, deliver_now
+from .pagination import EstimatedCountPaginator
+from .utilites import get_activation_email
 from .forms import SubCategoryForm
 
+# Число записей, обрабатываемых действиями администратора за один запрос
+ACTION_CHUNK_SIZE = 500
+
+
+def chunks(queryset, size=ACTION_CHUNK_SIZE):
+    """Записи набора пачками без загрузки всего набора в память"""
+    iterator = queryset.iterator(chunk_size=size)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            break
+        yield chunk
+
 
+@admin.action(description='Отправка писем для активации')
 def send_activation_notifications(modeladmin, request, queryset):
-    for rec in queryset:
-        if not rec.is_activated:
-            send_activation_notification(rec)
-    modeladmin.message_user(request, 'Письмо с информацией об активации отправлено')
-    send_activation_notifications.short_description = 'Отправка писем для активации'
+    keys = []
+    for users in chunks(queryset.filter(is_activated=False).order_by('pk')):
+        emails = [get_activation_email(user) for user in users]
+        enqueue_emails(emails)
+        keys += [email.dedup_key for email in emails]
+    if not keys:
+        modeladmin.message_user(request, 'Все выбранные пользователи уже активированы', messages.WARNING)
+        return
+    claimed, sent = deliver_now(keys)
+    level = messages.SUCCESS if sent == len(keys) else messages.WARNING
+    modeladmin.message_user(
+        request,
+        f'Писем для активации: {len(keys)}, отправлено: {sent}. '
+        f'Остальные {len(keys) - sent} будут отправлены из очереди',
+        level,
+    )
+
+
+class StoreModelAdmin(admin.ModelAdmin):
+    """Общие настройки списков: без второго подсчета всех записей и с оценкой числа записей больших таблиц"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class NonactivatedFilter(admin.SimpleListFilter):
@@ -38,7 +73,7 @@ class NonactivatedFilter(admin.SimpleListFilter):
             return queryset.filter(is_active=False, is_activated=False, date_joined_date_lt=d)
 
 
-class AdvUserAdmin(admin.ModelAdmin):
+class AdvUserAdmin(StoreModelAdmin):
     list_display = ('__str__', 'is_activated', 'date_joined')
     search_fields = ('username', 'email', 'first_name', 'last_name')
     list_filter = (NonactivatedFilter, )
@@ -54,36 +89,62 @@ class AdvUserAdmin(admin.ModelAdmin):
     readonly_fields = ('last_login', 'date_joined')
     actions = (send_activation_notifications, )
 
+    def delete_model(self, request, obj):
+        delete_user(obj)
+
+    def delete_queryset(self, request, queryset):
+        delete_products(Product.objects.filter(seller__in=queryset))
+        queryset.delete()
+
 
 class SubCategoryInline(admin.TabularInline):
     model = SubCategory
 
 
-class SuperCategoryAdmin(admin.ModelAdmin):
+class SuperCategoryAdmin(StoreModelAdmin):
     exclude = ('super_category',)
     inlines = (SubCategoryInline,)
 
 
-class SubCategoryAdmin(admin.ModelAdmin):
+class SubCategoryAdmin(StoreModelAdmin):
     form = SubCategoryForm
+    # Название подкатегории включает название надкатегории
+    list_select_related = ('super_category',)
 
 
 class AdditionalImageInline(admin.TabularInline):
     model = AdditionalImage
 
 
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('category', 'title', 'content', 'manufacturer', 'seller', 'created_at')
+class ProductAdmin(StoreModelAdmin):
+    list_display = ('category', 'title', 'content', 'manufacturer', 'seller', 'created_at', 'comment_count')
+    list_select_related = ('category__super_category', 'seller')
     fields = (
         'category', 'manufacturer', 'title', 'content', 'price', 'image', 'is_active', 'seller'
     )
     inlines = (AdditionalImageInline,)
 
+    def delete_model(self, request, obj):
+        delete_products(Product.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_products(queryset)
+
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(StoreModelAdmin):
     # model = Comment
-    pass
+    list_display = ('product', 'author', 'created_at', 'is_active')
+    list_select_related = ('product',)
+    list_editable = ('is_active',)
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(StoreModelAdmin):
+    list_display = ('to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to', 'dedup_key')
+    readonly_fields = ('dedup_key', 'to', 'subject', 'body', 'attempts', 'last_error', 'created_at', 'sent_at')
 
 
 # class CommentAdmin(admin.ModelAdmin):
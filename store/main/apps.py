@@ -1,20 +1,45 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 from django.dispatch import Signal
 
 from main.utilites import send_activation_notification
 
 
 user_registered = Signal()
+products_bulk_created = Signal()
+products_bulk_deleted = Signal()
+comments_bulk_created = Signal()
+thumbnails_generated = Signal()
 
 
 def user_registered_dispatcher(sender, **kwargs):
     send_activation_notification(kwargs['instance'])
 
 
+def sqlite_connection_dispatcher(sender, connection, **kwargs):
+    """Настройка нового соединения с SQLite по settings.SQLITE_PRAGMAS, реплика открывается только для чтения"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS)
+    if connection.alias == settings.REPLICA_DATABASE:
+        pragmas['query_only'] = 1
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
 user_registered.connect(user_registered_dispatcher)
+connection_created.connect(sqlite_connection_dispatcher)
 
 
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
     verbose_name = 'Ваш магазин'
+
+    def ready(self):
+        from . import caching, checks, counters, page_cache, thumbnails  # noqa: F401
+        from .search import search_setup_dispatcher
+        post_migrate.connect(search_setup_dispatcher, sender=self)
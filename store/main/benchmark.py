@@ -0,0 +1,176 @@
+import http.client
+import random
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .models import AdvUser, SubCategory, Product, Comment
+
+
+def percentile(values, percent):
+    """Процентиль по ближайшему рангу для отсортированного списка"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarize(timings, queries=None, elapsed=None, template_timings=None):
+    """Сводка по замерам одного сценария, время в миллисекундах"""
+    timings = sorted(timings)
+    result = {
+        'requests': len(timings),
+        'p50_ms': round(percentile(timings, 50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+        'throughput_rps': round(len(timings) / (elapsed or sum(timings)), 1),
+    }
+    if queries is not None:
+        result['queries_per_request'] = round(statistics.fmean(queries), 2)
+        result['max_queries'] = max(queries)
+    if template_timings is not None:
+        result['template_mean_ms'] = round(statistics.fmean(template_timings) * 1000, 2)
+    return result
+
+
+def template_time(response):
+    """Время вывода шаблонов из заголовка Server-Timing, в секундах"""
+    match = re.search(r'tpl;dur=([\d.]+)', response.get('Server-Timing', ''))
+    return float(match.group(1)) / 1000 if match else 0.0
+
+
+def get_host():
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+    return hosts[0] if hosts else 'localhost'
+
+
+def build_scenarios(seed=0, samples=50):
+    """Адреса для сценариев замера, выбираемые детерминированно по seed"""
+    rnd = random.Random(seed)
+    categories = list(SubCategory.objects.filter(product__is_active=True).values_list('pk', flat=True).distinct())
+    products = list(Product.objects.filter(is_active=True).order_by('pk').values_list('pk', 'category_id')[:1000])
+    words = [title.split()[0] for title in Product.objects.order_by('pk').values_list('title', flat=True)[:100]]
+    if not categories or not products:
+        return {}
+    picked = [rnd.choice(products) for _ in range(samples)]
+    return {
+        'index': [reverse('main:index')],
+        'by_category': [reverse('main:by_category', kwargs={'pk': rnd.choice(categories)}) for _ in range(samples)],
+        'by_category_keyword': [
+            reverse('main:by_category', kwargs={'pk': rnd.choice(categories)}) + '?keyword=' + rnd.choice(words)
+            for _ in range(samples)
+        ],
+        'detail': [reverse('main:detail', kwargs={'category_pk': category, 'pk': pk}) for pk, category in picked],
+        'api_products': ['/api/products/'],
+        'api_comments': [f'/api/products/{pk}/comments/' for pk, _ in picked],
+        'api_categories': ['/api/categories/'],
+    }
+
+
+def run_scenario(client, urls, requests, warmup=5, before_request=None):
+    for i in range(warmup):
+        client.get(urls[i % len(urls)])
+    timings = []
+    queries = []
+    template_timings = []
+    started = time.perf_counter()
+    for i in range(requests):
+        if before_request is not None:
+            before_request()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = client.get(urls[i % len(urls)])
+            timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f'{urls[i % len(urls)]}: ответ {response.status_code}')
+        queries.append(len(context))
+        template_timings.append(template_time(response))
+    return summarize(timings, queries, time.perf_counter() - started, template_timings)
+
+
+def run_benchmark(requests=200, warmup=5, seed=0, scenarios=None, before_request=None,
+                  logged_in=False, fragment_cache=True):
+    """Прогон сценариев через тестовый клиент Django.
+
+    logged_in - страницы запрашиваются от имени пользователя, для которого
+    не действует кэш страниц; fragment_cache=False отключает кэширование
+    фрагментов шаблонов, чтобы оценить выигрыш от него.
+    """
+    anonymous = Client(HTTP_HOST=get_host())
+    authorized = Client(HTTP_HOST=get_host())
+    user = AdvUser.objects.filter(is_active=True).order_by('pk').first()
+    if user is not None:
+        authorized.force_login(user)
+    results = {}
+    for name, urls in build_scenarios(seed).items():
+        if scenarios and name not in scenarios:
+            continue
+        client = authorized if logged_in or name == 'api_categories' else anonymous
+        with override_settings(FRAGMENT_CACHE_TIMEOUT=settings.FRAGMENT_CACHE_TIMEOUT if fragment_cache else 0):
+            results[name] = run_scenario(client, urls, requests, warmup, before_request)
+    return {
+        'dataset': {
+            'products': Product.objects.count(),
+            'comments': Comment.objects.count(),
+            'categories': SubCategory.objects.count(),
+            'users': AdvUser.objects.count(),
+        },
+        'scenarios': results,
+    }
+
+
+def run_http_scenario(base_url, urls, requests, concurrency, warmup=5):
+    """Прогон адресов по HTTP в concurrency потоков, у каждого потока свое постоянное соединение"""
+    base = urlsplit(base_url)
+    prefix = base.path.rstrip('/')
+
+    def worker(index):
+        connection = http.client.HTTPConnection(base.hostname, base.port or 80, timeout=60)
+        timings = []
+        try:
+            for i in range(index - warmup * concurrency, requests, concurrency):
+                url = prefix + urls[i % len(urls)]
+                start = time.perf_counter()
+                connection.request('GET', url)
+                response = connection.getresponse()
+                response.read()
+                if i >= 0:
+                    timings.append(time.perf_counter() - start)
+                if response.status != 200:
+                    raise RuntimeError(f'{url}: ответ {response.status}')
+        finally:
+            connection.close()
+        return timings
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        started = time.perf_counter()
+        timings = [timing for result in executor.map(worker, range(concurrency)) for timing in result]
+        elapsed = time.perf_counter() - started
+    result = summarize(timings, elapsed=elapsed)
+    result['concurrency'] = concurrency
+    return result
+
+
+def run_http_benchmark(targets, requests=1000, concurrency=32, warmup=5, seed=0, scenarios=('api_products', 'api_comments')):
+    """Сравнение развертываний (например, ASGI и WSGI) по одним и тем же адресам.
+
+    targets - словарь имя -> базовый адрес запущенного сервера. Время
+    включает предварительные запросы каждого потока, не попадающие в замеры.
+    """
+    built = build_scenarios(seed)
+    results = {}
+    for target, base_url in targets.items():
+        results[target] = {
+            name: run_http_scenario(base_url, built[name], requests, concurrency, warmup)
+            for name in scenarios if name in built
+        }
+    return results
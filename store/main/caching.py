@@ -0,0 +1,105 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+from .apps import products_bulk_created, products_bulk_deleted, comments_bulk_created, thumbnails_generated
+from .models import Category, SuperCategory, SubCategory, Product, AdditionalImage, Comment
+from .routers import read_from_replica
+
+CATEGORIES_VERSION = 'categories'
+PRODUCTS_VERSION = 'products'
+COMMENTS_VERSION = 'comments'
+
+
+def get_versions(*names):
+    """Текущие версии наборов данных, общие для всех процессов через кэш.
+
+    Версия - время последнего изменения в наносекундах, поэтому по ней же
+    определяется дата изменения данных.
+    """
+    keys = ['version:' + name for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def get_version(name):
+    return get_versions(name)[0]
+
+
+def bump_version(name):
+    """Смена версии набора данных после фиксации транзакции"""
+    transaction.on_commit(lambda: cache.set('version:' + name, time.time_ns(), None))
+
+
+class CategoryTree:
+    """Список подкатегорий для навигации, загружаемый один раз на процесс"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = (None, ())
+
+    def get_versioned(self):
+        """Версия списка и сам список подкатегорий"""
+        version = get_version(CATEGORIES_VERSION)
+        if version != self._loaded[0]:
+            with self._lock:
+                if version != self._loaded[0]:
+                    # Список хранится до смены версии, поэтому читается из основной БД:
+                    # реплика может еще не содержать изменений, сменивших версию
+                    with read_from_replica(False):
+                        self._loaded = (version, tuple(SubCategory.objects.select_related('super_category')))
+        return self._loaded
+
+    def get(self):
+        return self.get_versioned()[1]
+
+
+category_tree = CategoryTree()
+
+
+def categories_changed_dispatcher(sender, **kwargs):
+    bump_version(CATEGORIES_VERSION)
+
+
+def products_changed_dispatcher(sender, **kwargs):
+    bump_version(PRODUCTS_VERSION)
+
+
+def comments_changed_dispatcher(sender, **kwargs):
+    bump_version(COMMENTS_VERSION)
+
+
+def image_changed_dispatcher(sender, **kwargs):
+    """Смена версии товара, от которой зависят кэшированные фрагменты с его изображениями"""
+    Product.objects.filter(pk=kwargs['instance'].product_id).update(updated_at=timezone.now())
+
+
+def thumbnails_generated_dispatcher(sender, **kwargs):
+    """Смена версий товаров, кэшированные фрагменты которых выводят исходное изображение вместо миниатюр"""
+    Product.objects.filter(pk__in=[pk for pk, category_id in kwargs['products']]).update(updated_at=timezone.now())
+    bump_version(PRODUCTS_VERSION)
+
+
+for model in (Category, SuperCategory, SubCategory):
+    post_save.connect(categories_changed_dispatcher, sender=model)
+    post_delete.connect(categories_changed_dispatcher, sender=model)
+for model in (Product, AdditionalImage):
+    post_save.connect(products_changed_dispatcher, sender=model)
+    post_delete.connect(products_changed_dispatcher, sender=model)
+products_bulk_created.connect(products_changed_dispatcher)
+products_bulk_deleted.connect(products_changed_dispatcher)
+post_save.connect(comments_changed_dispatcher, sender=Comment)
+post_delete.connect(comments_changed_dispatcher, sender=Comment)
+comments_bulk_created.connect(comments_changed_dispatcher)
+post_save.connect(image_changed_dispatcher, sender=AdditionalImage)
+post_delete.connect(image_changed_dispatcher, sender=AdditionalImage)
+thumbnails_generated.connect(thumbnails_generated_dispatcher)
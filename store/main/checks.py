@@ -0,0 +1,21 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register, Tags
+
+
+def is_process_local(alias='default'):
+    """Кэш хранится в памяти процесса и не виден другим процессам"""
+    return isinstance(caches[alias], LocMemCache)
+
+
+@register(Tags.caches, deploy=True)
+def versions_cache_check(app_configs, **kwargs):
+    """Версии данных (main.caching) должны быть общими для всех процессов"""
+    if is_process_local():
+        return [Warning(
+            'Версии данных хранятся в кэше в памяти процесса',
+            hint='Другие процессы не узнают об изменениях: навигация, кэшированные страницы и фрагменты '
+                 'и ETag останутся прежними. Задайте CACHE_URL с общим кэшем (Redis, Memcached).',
+            id='main.W001',
+        )]
+    return []
@@ -0,0 +1,99 @@
+import hashlib
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from captcha.conf import settings as captcha_settings
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from .caching import get_versions
+from .routers import read_from_replica
+
+
+def has_pending_messages(request):
+    """Есть ли у запроса непоказанные сообщения; сами сообщения при этом не помечаются как показанные"""
+    return hasattr(request, '_messages') and len(get_messages(request)) > 0
+
+
+def captcha_window():
+    """Начало текущего интервала в половину времени жизни капчи, в наносекундах.
+
+    Страница с капчей, подтвержденная ответом 304 в пределах одного интервала,
+    не старше времени жизни капчи.
+    """
+    window = captcha_settings.CAPTCHA_TIMEOUT * 60 // 2 * 10 ** 9
+    return time.time_ns() // window * window
+
+
+def last_modified(versions):
+    return max(versions) // 10 ** 9
+
+
+def conditional(*names, anonymous_only=False, form=False):
+    """ETag и Last-Modified по версиям наборов данных без выполнения запросов к БД.
+
+    anonymous_only - условные ответы только для анонимных посетителей без
+    непоказанных сообщений; form - страница содержит форму с капчей и
+    CSRF-токеном, которые не должны устаревать в кэше браузера.
+    Ответ с ETag строится по основной БД: ETag содержит текущие версии, а
+    реплика может еще не содержать изменений, сменивших их.
+    """
+    def get_state(request):
+        if not hasattr(request, '_conditional_state'):
+            state = None
+            if request.method in ('GET', 'HEAD') and not (
+                anonymous_only and (request.user.is_authenticated or has_pending_messages(request))
+            ):
+                versions = get_versions(*names)
+                etag = '-'.join(map(str, versions))
+                if form:
+                    versions.append(captcha_window())
+                    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+                    etag += '-%d-%s' % (versions[-1], hashlib.md5(csrf_cookie.encode()).hexdigest()[:8])
+                state = (etag, datetime.fromtimestamp(last_modified(versions), tz=timezone.utc))
+            request._conditional_state = state
+        return request._conditional_state
+
+    def etag_func(request, *args, **kwargs):
+        state = get_state(request)
+        return state and state[0]
+
+    def last_modified_func(request, *args, **kwargs):
+        state = get_state(request)
+        return state and state[1]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with read_from_replica(False) if get_state(request) else nullcontext():
+                return view(request, *args, **kwargs)
+        return condition(etag_func=etag_func, last_modified_func=last_modified_func)(wrapper)
+    return decorator
+
+
+def aconditional(*names):
+    """Вариант conditional для асинхронных контроллеров"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+            versions = await sync_to_async(get_versions)(*names)
+            etag = quote_etag('-'.join(map(str, versions)))
+            modified = last_modified(versions)
+            response = get_conditional_response(request, etag=etag, last_modified=modified)
+            if response is None:
+                with read_from_replica(False):
+                    response = await view(request, *args, **kwargs)
+            if not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(modified)
+            response.headers.setdefault('ETag', etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,235 @@
+from collections import Counter
+
+from django.db.models import F, OuterRef, Subquery, Count, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+
+from .apps import products_bulk_created, products_bulk_deleted, comments_bulk_created
+from .caching import CATEGORIES_VERSION, bump_version
+from .models import AdvUser, Category, Product, Comment, SellerStats
+
+# Поля, сохраненные значения которых нужны для пересчета счетчиков
+TRACKED_FIELDS = {
+    Product: ('is_active', 'category_id', 'seller_id', 'comment_count'),
+    Comment: ('is_active', 'product_id'),
+}
+
+
+def update_counters(queryset, deltas, **values):
+    """Изменение счетчиков записей одним запросом UPDATE без чтения записей.
+
+    Счетчики, которые стали бы отрицательными, не изменяются: такие записи
+    исправляет reconcile_counters.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas and not values:
+        return
+    for field, delta in deltas.items():
+        if delta < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta for field, delta in deltas.items()}, **values)
+
+
+def change_counter(model, pk, field, delta):
+    """Изменение счетчика записи одним запросом UPDATE без чтения записи"""
+    if pk is None or not delta:
+        return
+    update_counters(model.objects.filter(pk=pk), {field: delta})
+
+
+def products_field(is_active):
+    """Счетчик сводки продавца, в котором учитывается товар"""
+    return 'active_products' if is_active else 'inactive_products'
+
+
+def change_seller_stats(seller_pk, deltas, touch=True):
+    """Изменение сводки продавца, touch - отметить время последней активности"""
+    values = {'last_activity_at': timezone.now()} if touch else {}
+    update_counters(SellerStats.objects.filter(seller=seller_pk), deltas, **values)
+
+
+def change_product_seller_stats(product_pk, deltas, touch=False):
+    """Изменение сводки продавца товара product_pk без чтения товара"""
+    if product_pk is None:
+        return
+    values = {'last_activity_at': timezone.now()} if touch else {}
+    update_counters(SellerStats.objects.filter(seller__product=product_pk), deltas, **values)
+
+
+def move_counter(model, field, old_pk, new_pk):
+    """Перенос записи из счетчика old_pk в счетчик new_pk, None - запись не учитывается.
+
+    Возвращает True, если счетчики изменились.
+    """
+    if old_pk == new_pk:
+        return False
+    change_counter(model, old_pk, field, -1)
+    change_counter(model, new_pk, field, 1)
+    return True
+
+
+def counted_pk(state, field_name):
+    """Запись, в счетчике которой учитывается активная запись с состоянием state"""
+    if state is None or not state['is_active']:
+        return None
+    return state[field_name]
+
+
+def saved_state_dispatcher(sender, **kwargs):
+    """Запоминание значений отслеживаемых полей, сохраненных в БД, перед сохранением записи"""
+    instance = kwargs['instance']
+    instance._saved_state = None
+    if instance.pk is not None and not kwargs['raw']:
+        instance._saved_state = sender._base_manager.filter(pk=instance.pk) \
+            .values(*TRACKED_FIELDS[sender]).first()
+
+
+def product_saved_dispatcher(sender, **kwargs):
+    instance = kwargs['instance']
+    old = counted_pk(getattr(instance, '_saved_state', None), 'category_id')
+    new = instance.category_id if instance.is_active else None
+    if move_counter(Category, 'product_count', old, new):
+        bump_version(CATEGORIES_VERSION)
+    state = getattr(instance, '_saved_state', None)
+    deltas = Counter({products_field(instance.is_active): 1})
+    if state is not None and state['seller_id'] != instance.seller_id:
+        # Товар передан другому продавцу вместе с комментариями
+        change_seller_stats(state['seller_id'], {
+            products_field(state['is_active']): -1, 'comment_count': -state['comment_count'],
+        }, touch=False)
+        deltas['comment_count'] += state['comment_count']
+    elif state is not None:
+        deltas[products_field(state['is_active'])] -= 1
+    change_seller_stats(instance.seller_id, deltas)
+
+
+def product_deleted_dispatcher(sender, **kwargs):
+    instance = kwargs['instance']
+    if instance.is_active:
+        change_counter(Category, instance.category_id, 'product_count', -1)
+        bump_version(CATEGORIES_VERSION)
+    # Комментарии удаляются раньше товара и вычитаются из сводки по одному
+    change_seller_stats(instance.seller_id, {products_field(instance.is_active): -1})
+
+
+def comment_saved_dispatcher(sender, **kwargs):
+    instance = kwargs['instance']
+    old = counted_pk(getattr(instance, '_saved_state', None), 'product_id')
+    new = instance.product_id if instance.is_active else None
+    if move_counter(Product, 'comment_count', old, new):
+        change_product_seller_stats(old, {'comment_count': -1})
+        change_product_seller_stats(new, {'comment_count': 1}, touch=True)
+    elif kwargs['created']:
+        change_product_seller_stats(instance.product_id, {}, touch=True)
+
+
+def comment_deleted_dispatcher(sender, **kwargs):
+    instance = kwargs['instance']
+    if instance.is_active:
+        change_counter(Product, instance.product_id, 'comment_count', -1)
+        change_product_seller_stats(instance.product_id, {'comment_count': -1})
+
+
+def comments_bulk_created_dispatcher(sender, **kwargs):
+    counts = Counter(comment.product_id for comment in kwargs['comments'] if comment.is_active)
+    for pk, count in counts.items():
+        change_counter(Product, pk, 'comment_count', count)
+        change_product_seller_stats(pk, {'comment_count': count}, touch=True)
+
+
+def seller_created_dispatcher(sender, **kwargs):
+    if kwargs['created'] and not kwargs['raw']:
+        SellerStats.objects.create(seller=kwargs['instance'])
+
+
+def products_bulk_created_dispatcher(sender, **kwargs):
+    counts = Counter(product.category_id for product in kwargs['products'] if product.is_active)
+    for pk, count in counts.items():
+        change_counter(Category, pk, 'product_count', count)
+    if counts:
+        bump_version(CATEGORIES_VERSION)
+    sellers = {}
+    for product in kwargs['products']:
+        sellers.setdefault(product.seller_id, Counter())[products_field(product.is_active)] += 1
+    for pk, deltas in sellers.items():
+        change_seller_stats(pk, deltas)
+
+
+def products_bulk_deleted_dispatcher(sender, **kwargs):
+    counts = {pk: count for pk, count in kwargs['categories'].items() if count}
+    for pk, count in counts.items():
+        change_counter(Category, pk, 'product_count', -count)
+    if counts:
+        bump_version(CATEGORIES_VERSION)
+    for pk, deltas in kwargs.get('sellers', {}).items():
+        change_seller_stats(pk, {field: -count for field, count in deltas.items()}, touch=False)
+
+
+def rebuild_seller_stats(queryset):
+    """Пересчет сводок продавцов по таблицам товаров и комментариев, возвращает число исправленных"""
+    products = Product.objects.filter(seller=OuterRef('seller')).order_by().values('seller')
+
+    def aggregate(queryset, expression):
+        return Subquery(queryset.annotate(value=expression).values('value'))
+
+    active_products = Coalesce(aggregate(products.filter(is_active=True), Count('pk')), Value(0))
+    inactive_products = Coalesce(aggregate(products.filter(is_active=False), Count('pk')), Value(0))
+    comment_count = Coalesce(aggregate(products, Sum('comment_count')), Value(0))
+    updated_at = aggregate(products, Max('updated_at'))
+    commented_at = aggregate(
+        Comment.objects.filter(product__seller=OuterRef('seller')).order_by().values('product__seller'),
+        Max('created_at'),
+    )
+    return queryset.exclude(
+        active_products=active_products, inactive_products=inactive_products, comment_count=comment_count,
+    ).update(
+        active_products=active_products, inactive_products=inactive_products, comment_count=comment_count,
+        last_activity_at=Greatest(Coalesce(updated_at, commented_at), Coalesce(commented_at, updated_at)),
+    )
+
+
+def get_seller_stats(seller):
+    """Сводка продавца, при отсутствии создается и заполняется по таблицам"""
+    stats = SellerStats.objects.filter(seller=seller).first()
+    if stats is None:
+        SellerStats.objects.bulk_create([SellerStats(seller=seller)], ignore_conflicts=True)
+        rebuild_seller_stats(SellerStats.objects.filter(seller=seller))
+        stats = SellerStats.objects.get(seller=seller)
+    return stats
+
+
+def reconcile_counters():
+    """Пересчет всех счетчиков по данным таблиц, возвращает число исправленных записей по видам"""
+    comment_count = Coalesce(Subquery(
+        Comment.objects.filter(product=OuterRef('pk'), is_active=True).order_by()
+        .values('product').annotate(count=Count('pk')).values('count')
+    ), Value(0))
+    product_count = Coalesce(Subquery(
+        Product.objects.filter(category=OuterRef('pk'), is_active=True).order_by()
+        .values('category').annotate(count=Count('pk')).values('count')
+    ), Value(0))
+    counts = {
+        'products': Product.objects.exclude(comment_count=comment_count).update(comment_count=comment_count),
+        'categories': Category.objects.exclude(product_count=product_count).update(product_count=product_count),
+    }
+    if any(counts.values()):
+        bump_version(CATEGORIES_VERSION)
+    SellerStats.objects.bulk_create(
+        (SellerStats(seller_id=pk) for pk in AdvUser.objects.filter(stats=None).values_list('pk', flat=True)),
+        ignore_conflicts=True,
+    )
+    counts['sellers'] = rebuild_seller_stats(SellerStats.objects.all())
+    return counts
+
+
+for model in TRACKED_FIELDS:
+    pre_save.connect(saved_state_dispatcher, sender=model)
+post_save.connect(product_saved_dispatcher, sender=Product)
+post_delete.connect(product_deleted_dispatcher, sender=Product)
+post_save.connect(comment_saved_dispatcher, sender=Comment)
+post_delete.connect(comment_deleted_dispatcher, sender=Comment)
+post_save.connect(seller_created_dispatcher, sender=AdvUser)
+comments_bulk_created.connect(comments_bulk_created_dispatcher)
+products_bulk_created.connect(products_bulk_created_dispatcher)
+products_bulk_deleted.connect(products_bulk_deleted_dispatcher)
@@ -0,0 +1,85 @@
+from django.db import transaction
+from easy_thumbnails.files import get_thumbnailer
+
+from .apps import products_bulk_deleted
+from .models import Product, AdditionalImage, Comment, DeletedFile
+from .storage import ContentAddressedStorage
+from .thumbnails import get_field_file
+
+
+def _raw_delete(queryset):
+    """Удаление записей одним запросом DELETE, без выборки записей и отправки сигналов"""
+    return queryset._raw_delete(queryset.db)
+
+
+def _defer_files(queryset, field_name):
+    """Постановка файлов записей в очередь на удаление, возвращает их число"""
+    field = f'{queryset.model._meta.label}.{field_name}'
+    names = queryset.exclude(**{field_name: ''}).values_list(field_name, flat=True).iterator()
+    files = DeletedFile.objects.bulk_create(DeletedFile(field=field, name=name) for name in names)
+    return len(files)
+
+
+def delete_additional_images(queryset):
+    """Удаление дополнительных изображений набором запросов"""
+    with transaction.atomic():
+        counts = {'files': _defer_files(queryset, 'image')}
+        counts['additional_images'] = _raw_delete(queryset)
+    return counts
+
+
+def delete_products(queryset):
+    """Удаление товаров вместе с комментариями и изображениями набором запросов в одной транзакции.
+
+    Файлы не удаляются сразу, а ставятся в очередь для команды cleanup_files.
+    Возвращает число удаленных записей по видам.
+    """
+    with transaction.atomic():
+        rows = list(queryset.values_list('pk', 'category_id', 'is_active', 'seller_id', 'comment_count'))
+        pks = [row[0] for row in rows]
+        # Число удаляемых активных товаров по категориям и сводки удаляемого по продавцам
+        categories = {}
+        sellers = {}
+        for pk, category_id, is_active, seller_id, comment_count in rows:
+            categories[category_id] = categories.get(category_id, 0) + is_active
+            deltas = sellers.setdefault(seller_id, {'active_products': 0, 'inactive_products': 0, 'comment_count': 0})
+            deltas['active_products' if is_active else 'inactive_products'] += 1
+            deltas['comment_count'] += comment_count
+        products = Product.objects.filter(pk__in=queryset.values('pk'))
+        counts = delete_additional_images(AdditionalImage.objects.filter(product__in=products))
+        counts['files'] += _defer_files(products, 'image')
+        counts['comments'] = _raw_delete(Comment.objects.filter(product__in=products))
+        counts['products'] = _raw_delete(products)
+        products_bulk_deleted.send(sender=Product, pks=pks, categories=categories, sellers=sellers)
+    return counts
+
+
+def delete_user(user):
+    """Удаление пользователя со всеми его товарами"""
+    with transaction.atomic():
+        counts = delete_products(user.product_set.all())
+        deleted = type(user).objects.filter(pk=user.pk).delete()[1]
+    counts['users'] = deleted.get(user._meta.label, 0)
+    return counts
+
+
+def cleanup_files(batch_size=500):
+    """Удаление из хранилища одной пачки файлов из очереди, возвращает число обработанных.
+
+    Файлы, на которые еще ссылаются другие записи, остаются в хранилище.
+    Недавно загруженные повторно файлы остаются в очереди до следующего запуска.
+    """
+    files = list(DeletedFile.objects.order_by('pk')[:batch_size])
+    done = []
+    for file in files:
+        fieldfile = get_thumbnailer(get_field_file(*file.field.rsplit('.', 1), file.name))
+        if isinstance(fieldfile.storage, ContentAddressedStorage):
+            if fieldfile.storage.is_recent(file.name):
+                continue
+            fieldfile.storage.try_delete(file.name, fieldfile.delete_thumbnails)
+        else:
+            fieldfile.delete_thumbnails()
+            fieldfile.storage.delete(file.name)
+        done.append(file.pk)
+    DeletedFile.objects.filter(pk__in=done).delete()
+    return len(done)
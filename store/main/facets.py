@@ -0,0 +1,99 @@
+from collections import Counter
+
+from django.db.models import Case, When, Value, CharField, Count, Q
+
+# Диапазоны цен: ключ в параметре price, подпись, нижняя (включительно) и верхняя границы
+PRICE_RANGES = (
+    ('0-1000', 'до 1 000 руб.', None, 1000),
+    ('1000-5000', '1 000 - 5 000 руб.', 1000, 5000),
+    ('5000-20000', '5 000 - 20 000 руб.', 5000, 20000),
+    ('20000-', 'от 20 000 руб.', 20000, None),
+)
+MAX_MANUFACTURERS = 20
+
+
+class FacetSelection:
+    """Значения фасетов, выбранные в параметрах запроса manufacturer и price"""
+    def __init__(self, manufacturers=(), price=None):
+        self.manufacturers = tuple(manufacturers)
+        self.price = price
+
+    @classmethod
+    def from_params(cls, params):
+        manufacturers = sorted({value.strip() for value in params.getlist('manufacturer') if value.strip()})
+        price = params.get('price')
+        if price not in {key for key, label, low, high in PRICE_RANGES}:
+            price = None
+        return cls(manufacturers[:MAX_MANUFACTURERS], price)
+
+    def __bool__(self):
+        return bool(self.manufacturers or self.price)
+
+    def get_params(self):
+        """Параметры запроса для ссылок постраничного вывода"""
+        params = [('manufacturer', manufacturer) for manufacturer in self.manufacturers]
+        if self.price:
+            params.append(('price', self.price))
+        return params
+
+    def matches(self, manufacturer=None, price=None):
+        return (manufacturer is None or not self.manufacturers or manufacturer in self.manufacturers) \
+            and (price is None or not self.price or price == self.price)
+
+
+def price_range_q(key):
+    low, high = next((low, high) for k, label, low, high in PRICE_RANGES if k == key)
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def price_range():
+    """Ключ диапазона цены товара, вычисляемый в запросе"""
+    return Case(
+        *(When(price_range_q(key), then=Value(key)) for key, label, low, high in PRICE_RANGES),
+        output_field=CharField(),
+    )
+
+
+def filter_products(queryset, selection):
+    if selection.manufacturers:
+        queryset = queryset.filter(manufacturer__in=selection.manufacturers)
+    if selection.price:
+        queryset = queryset.filter(price_range_q(selection.price))
+    return queryset
+
+
+def get_facets(queryset, selection):
+    """Число товаров по значениям фасетов одним запросом с группировкой.
+
+    queryset - товары до применения фасетов. Запрос возвращает число товаров
+    для каждого сочетания производителя и диапазона цены, из которых
+    вычисляются все счетчики: для значений фасета учитывается выбор в других
+    фасетах, но не в нем самом, чтобы можно было расширить выбор.
+    """
+    rows = queryset.order_by().values('manufacturer', price_key=price_range()).annotate(count=Count('pk'))
+    manufacturers = Counter({manufacturer: 0 for manufacturer in selection.manufacturers})
+    prices = Counter()
+    total = 0
+    for row in rows:
+        if selection.matches(price=row['price_key']):
+            manufacturers[row['manufacturer']] += row['count']
+        if selection.matches(manufacturer=row['manufacturer']):
+            prices[row['price_key']] += row['count']
+            if selection.matches(price=row['price_key']):
+                total += row['count']
+    return {
+        'count': total,
+        'manufacturer': [
+            {'value': manufacturer, 'count': count, 'selected': manufacturer in selection.manufacturers}
+            for manufacturer, count in sorted(manufacturers.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'price': [
+            {'value': key, 'label': label, 'count': prices[key], 'selected': key == selection.price}
+            for key, label, low, high in PRICE_RANGES
+        ],
+    }
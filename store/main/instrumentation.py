@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+_current_stats = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Число запросов к БД и затраченное время в пределах одного запроса.
+
+    track_db - учитываются ли запросы к БД; в асинхронных контроллерах
+    запросы выполняются в потоках sync_to_async и не учитываются.
+    """
+    def __init__(self, track_db=True):
+        self.track_db = track_db
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self._rendering = False
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+
+    def server_timing(self):
+        timing = f'tpl;dur={self.template_time * 1000:.1f}, total;dur={self.total_time * 1000:.1f}'
+        if self.track_db:
+            timing = f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", ' + timing
+        return timing
+
+
+class TimedTemplate(Template):
+    """Шаблон, учитывающий время вывода в статистике текущего запроса"""
+    def render(self, context=None, request=None):
+        stats = _current_stats.get()
+        if stats is None or stats._rendering:
+            return super().render(context, request)
+        stats._rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+            stats._rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, замеряющий время вывода шаблонов"""
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class ViewStatsRegistry:
+    """Накопленная в процессе статистика по контроллерам"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, stats):
+        with self._lock:
+            view = self._views.setdefault(view_name, {
+                'requests': 0, 'db_requests': 0, 'queries': 0, 'max_queries': 0,
+                'db_time': 0.0, 'template_time': 0.0, 'total_time': 0.0, 'max_total_time': 0.0,
+            })
+            view['requests'] += 1
+            if stats.track_db:
+                view['db_requests'] += 1
+                view['queries'] += stats.queries
+                view['max_queries'] = max(view['max_queries'], stats.queries)
+                view['db_time'] += stats.db_time
+            view['template_time'] += stats.template_time
+            view['total_time'] += stats.total_time
+            view['max_total_time'] = max(view['max_total_time'], stats.total_time)
+
+    def snapshot(self):
+        """Средние и максимальные значения по каждому контроллеру, время в миллисекундах"""
+        with self._lock:
+            views = {name: dict(view) for name, view in self._views.items()}
+        result = {}
+        for name, view in sorted(views.items()):
+            n = view['requests']
+            db_n = view['db_requests']
+            result[name] = {
+                'requests': n,
+                'avg_queries': round(view['queries'] / db_n, 2) if db_n else None,
+                'max_queries': view['max_queries'],
+                'avg_db_ms': round(view['db_time'] * 1000 / db_n, 2) if db_n else None,
+                'avg_template_ms': round(view['template_time'] * 1000 / n, 2),
+                'avg_total_ms': round(view['total_time'] * 1000 / n, 2),
+                'max_total_ms': round(view['max_total_time'] * 1000, 2),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = ViewStatsRegistry()
+
+
+class RequestStatsMiddleware:
+    """Замер запросов к БД, времени вывода шаблонов и общего времени обработки запроса.
+
+    Результаты отдаются в заголовке Server-Timing и накапливаются в registry
+    по имени контроллера. Поддерживает и синхронный, и асинхронный режим.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats(track_db=False)
+        token = _current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        stats.finish()
+        response['Server-Timing'] = stats.server_timing()
+        if request.resolver_match is not None:
+            registry.record(request.resolver_match.view_name, stats)
+        return response
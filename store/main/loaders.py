@@ -0,0 +1,58 @@
+from .models import Product, AdditionalImage, Comment
+from .pagination import KeysetPaginator
+
+COMMENTS_PER_PAGE = 10
+
+
+class ProductDetail:
+    """Товар, его дополнительные изображения и первая страница комментариев"""
+    def __init__(self, product, images, comments):
+        self.product = product
+        self.images = images
+        self.comments = comments
+
+
+def _detail_querysets(pk, category_pk, product_fields, comment_fields, per_page):
+    products = Product.objects.filter(is_active=True)
+    if category_pk is not None:
+        products = products.filter(category=category_pk)
+    if product_fields is None:
+        products = products.select_related('category__super_category')
+    else:
+        products = products.values(*product_fields)
+    comments = Comment.objects.filter(product=pk, is_active=True)
+    if comment_fields is not None:
+        # Поля сортировки нужны для курсора следующей страницы
+        comments = comments.values(*dict.fromkeys([*comment_fields, 'created_at', 'id']))
+    return products, AdditionalImage.objects.filter(product=pk), KeysetPaginator(comments, per_page)
+
+
+def load_product_detail(pk, category_pk=None, product_fields=None, comment_fields=None,
+                        per_page=COMMENTS_PER_PAGE):
+    """Загрузка товара для страницы товара и API не более чем тремя запросами.
+
+    Товар выбирается вместе с категорией и надкатегорией, изображения
+    возвращаются невыполненным запросом, комментарии - первой страницей
+    KeysetPaginator, следующие страницы выбираются по ее курсору.
+    Неактивный товар и товар другой категории (если задана category_pk) не
+    загружаются: возбуждается Product.DoesNotExist. При заданных
+    product_fields и comment_fields товар и комментарии выбираются строками
+    .values() с этими полями.
+    """
+    products, images, paginator = _detail_querysets(pk, category_pk, product_fields, comment_fields, per_page)
+    product = products.get(pk=pk)
+    return ProductDetail(product, images, paginator.page())
+
+
+async def aload_product_detail(pk, category_pk=None, product_fields=None, comment_fields=None,
+                               per_page=COMMENTS_PER_PAGE):
+    """Вариант load_product_detail для асинхронных контроллеров, изображения загружаются списком"""
+    products, images, paginator = _detail_querysets(pk, category_pk, product_fields, comment_fields, per_page)
+    product = await products.aget(pk=pk)
+    images = [image async for image in images]
+    return ProductDetail(product, images, await paginator.apage())
+
+
+def comments_page(pk, cursor=None, per_page=COMMENTS_PER_PAGE):
+    """Страница комментариев товара по курсору"""
+    return KeysetPaginator(Comment.objects.filter(product=pk, is_active=True), per_page).page(cursor)
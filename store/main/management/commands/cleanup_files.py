@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from main.deletion import cleanup_files
+
+
+class Command(BaseCommand):
+    help = 'Удаление из хранилища файлов удаленных товаров и изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            count = cleanup_files(options['batch_size'])
+            if not count:
+                break
+            total += count
+        self.stdout.write(self.style.SUCCESS(f'Удалено файлов: {total}'))
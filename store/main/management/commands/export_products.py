@@ -0,0 +1,59 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from main.models import Product
+
+FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'content': 'content',
+    'price': 'price',
+    'manufacturer': 'manufacturer',
+    'category': 'category__name',
+    'seller': 'seller__username',
+    'is_active': 'is_active',
+    'image': 'image',
+    'created_at': 'created_at',
+}
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка товаров в CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для выгрузки, "-" - стандартный вывод')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='По умолчанию определяется по расширению')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--category', type=int, help='Только товары подкатегории')
+        parser.add_argument('--seller', help='Только товары продавца с указанным именем')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.json')) else 'csv')
+        products = Product.objects.order_by('pk')
+        if options['category']:
+            products = products.filter(category=options['category'])
+        if options['seller']:
+            products = products.filter(seller__username=options['seller'])
+        rows = products.values_list(*FIELDS.values()).iterator(chunk_size=options['chunk_size'])
+        stream = sys.stdout if options['path'] == '-' else open(options['path'], 'w', newline='', encoding='utf-8')
+        count = 0
+        try:
+            if fmt == 'csv':
+                writer = csv.writer(stream)
+                writer.writerow(FIELDS)
+                for row in rows:
+                    writer.writerow(row)
+                    count += 1
+            else:
+                for row in rows:
+                    record = dict(zip(FIELDS, row))
+                    record['created_at'] = record['created_at'].isoformat()
+                    stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    count += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        self.stderr.write(f'Выгружено товаров: {count}')
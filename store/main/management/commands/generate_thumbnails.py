@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from main.thumbnails import THUMBNAIL_FIELDS, generate_thumbnails, get_executor
+
+
+class Command(BaseCommand):
+    help = 'Создание миниатюр для уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        tasks = []
+        for model, field_name in THUMBNAIL_FIELDS:
+            names = model.objects.exclude(**{field_name: ''}).values_list(field_name, flat=True).distinct()
+            tasks.extend((model._meta.label, field_name, name) for name in names.iterator())
+        if not tasks:
+            return
+        counts = get_executor().map(generate_thumbnails, *zip(*tasks), chunksize=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {len(tasks)}, миниатюр: {sum(counts)}'
+        ))
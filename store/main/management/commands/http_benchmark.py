@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.benchmark import run_http_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение пропускной способности запущенных серверов при параллельных запросах, например: '
+        'API_ASYNC_VIEWS=1 uvicorn store.asgi:application --port 8001 и '
+        'gunicorn store.wsgi --threads 32 --bind :8000, затем '
+        'http_benchmark --target asgi=http://127.0.0.1:8001 --target wsgi=http://127.0.0.1:8000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, help='Имя=адрес сервера')
+        parser.add_argument('--requests', type=int, default=1000, help='Запросов на сценарий')
+        parser.add_argument('--concurrency', type=int, default=32, help='Число параллельных соединений')
+        parser.add_argument('--warmup', type=int, default=5, help='Предварительных запросов на соединение')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Сценарии из run_benchmark, по умолчанию api_products и api_comments',
+        )
+        parser.add_argument('--output', help='Файл для отчета в JSON, по умолчанию стандартный вывод')
+
+    def handle(self, *args, **options):
+        targets = {}
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            if not sep or not url.startswith('http://'):
+                raise CommandError(f'Неверная цель {target}, ожидается имя=http://хост:порт')
+            targets[name] = url
+        report = run_http_benchmark(
+            targets, options['requests'], options['concurrency'], options['warmup'], options['seed'],
+            options['scenarios'] or ('api_products', 'api_comments'),
+        )
+        report = {
+            'options': {key: options[key] for key in ('requests', 'concurrency', 'warmup', 'seed')},
+            'targets': report,
+        }
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data)
+        else:
+            self.stdout.write(data)
@@ -0,0 +1,135 @@
+import csv
+import json
+import math
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.apps import products_bulk_created
+from main.models import AdvUser, Product, SubCategory
+
+
+def read_jsonl(stream):
+    """Записи JSONL; вместо строки, которую не удалось разобрать, выдается исключение"""
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+
+
+def validate_row(row):
+    """Текст ошибки в строке файла, None - строку можно загружать"""
+    if not isinstance(row, dict):
+        return f'неверный формат строки: {row}'
+    if not str(row.get('title') or '').strip():
+        return 'не указано название'
+    for name in ('title', 'manufacturer'):
+        max_length = Product._meta.get_field(name).max_length
+        if len(str(row.get(name) or '')) > max_length:
+            return f'поле {name} длиннее {max_length} символов'
+    try:
+        price = float(row.get('price') or 0)
+    except (TypeError, ValueError):
+        return f'цена {row.get("price")!r} не является числом'
+    if not math.isfinite(price) or price < 0:
+        return f'неверная цена {row.get("price")!r}'
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Потоковая загрузка товаров из CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с товарами, "-" - стандартный ввод')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='По умолчанию определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--image-dir', default='.', help='Каталог, относительно которого указаны изображения')
+        parser.add_argument('--workers', type=int, default=8, help='Потоков для загрузки изображений')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.json')) else 'csv')
+        self.image_dir = options['image_dir']
+        self.categories = {}
+        self.imported = self.skipped = 0
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        try:
+            if fmt == 'csv':
+                rows = csv.DictReader(stream)
+            else:
+                rows = read_jsonl(stream)
+            rows = enumerate(rows, start=1)
+            self.executor = ThreadPoolExecutor(max_workers=options['workers'])
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.import_batch(batch)
+        finally:
+            self.executor.shutdown()
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS(f'Загружено товаров: {self.imported}, пропущено: {self.skipped}'))
+
+    def resolve_categories(self, keys):
+        """Подкатегории по id или названию, одним запросом на пачку"""
+        missing = {key for key in keys if key not in self.categories}
+        ids = {key for key in missing if key.isdigit()}
+        for category in SubCategory.objects.filter(pk__in=ids):
+            self.categories[str(category.pk)] = category
+        for category in SubCategory.objects.filter(name__in=missing - ids):
+            self.categories[category.name] = category
+
+    def import_batch(self, batch):
+        valid = []
+        for line, row in batch:
+            error = validate_row(row)
+            if error:
+                self.stderr.write(f'Строка {line}: {error}')
+                self.skipped += 1
+            else:
+                valid.append((line, row))
+        batch = valid
+        self.resolve_categories({str(row.get('category', '')) for _, row in batch})
+        sellers = AdvUser.objects.in_bulk({row.get('seller') for _, row in batch}, field_name='username')
+        products = []
+        for line, row in batch:
+            category = self.categories.get(str(row.get('category', '')))
+            seller = sellers.get(row.get('seller'))
+            if category is None or seller is None:
+                self.stderr.write(f'Строка {line}: неизвестная категория или продавец')
+                self.skipped += 1
+                continue
+            products.append(Product(
+                category=category, seller=seller, title=str(row['title']).strip(),
+                content=str(row.get('content') or ''), price=float(row.get('price') or 0),
+                manufacturer=str(row.get('manufacturer') or ''),
+                is_active=str(row.get('is_active', '')).lower() not in ('0', 'false', 'no'),
+            ))
+            products[-1]._image_path = row.get('image') or ''
+        for product, (name, error) in zip(products, self.executor.map(self.store_image, products)):
+            product.image = name
+            if error:
+                self.stderr.write(f'Товар {product.title}: {error}')
+        with transaction.atomic():
+            Product.objects.bulk_create(products)
+            products_bulk_created.send(sender=Product, products=products)
+        self.imported += len(products)
+
+    def store_image(self, product):
+        """Копирование изображения товара в хранилище, возвращает имя файла и текст ошибки"""
+        if not product._image_path:
+            return '', None
+        path = os.path.join(self.image_dir, product._image_path)
+        field = Product._meta.get_field('image')
+        try:
+            with open(path, 'rb') as f:
+                return field.storage.save(field.generate_filename(product, os.path.basename(path)), File(f)), None
+        except OSError as e:
+            return '', f'не удалось загрузить изображение {path}: {e}'
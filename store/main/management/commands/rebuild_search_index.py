@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Product
+from main.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Полная перестройка поискового индекса товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = get_backend().rebuild(Product.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано товаров: {count}'))
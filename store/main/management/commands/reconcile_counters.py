@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчет счетчиков комментариев у товаров, товаров у категорий и сводок продавцов'
+
+    def handle(self, *args, **options):
+        counts = reconcile_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счетчиков: товаров {counts["products"]}, категорий {counts["categories"]}, '
+            f'продавцов {counts["sellers"]}'
+        ))
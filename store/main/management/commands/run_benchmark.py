@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from main.benchmark import run_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Замер задержек, числа запросов к БД и пропускной способности основных страниц и API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--scenario', action='append', dest='scenarios', help='Только указанные сценарии')
+        parser.add_argument('--output', help='Файл для отчета в JSON, по умолчанию стандартный вывод')
+        parser.add_argument('--logged-in', action='store_true',
+                            help='Запросы от имени пользователя, для которого не действует кэш страниц')
+        parser.add_argument('--no-fragment-cache', action='store_false', dest='fragment_cache',
+                            help='Без кэширования фрагментов шаблонов')
+
+    def handle(self, *args, **options):
+        report = run_benchmark(
+            options['requests'], options['warmup'], options['seed'], options['scenarios'],
+            logged_in=options['logged_in'], fragment_cache=options['fragment_cache'],
+        )
+        report['options'] = {
+            key: options[key] for key in ('requests', 'warmup', 'seed', 'logged_in', 'fragment_cache')
+        }
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data)
+        else:
+            self.stdout.write(data)
@@ -0,0 +1,103 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.apps import products_bulk_created
+from main.counters import reconcile_counters
+from main.deletion import delete_products
+from main.models import AdvUser, SuperCategory, SubCategory, Product, AdditionalImage, Comment
+
+USERNAME_PREFIX = 'seed_user_'
+
+WORDS = (
+    'телефон', 'ноутбук', 'планшет', 'наушники', 'колонка', 'монитор', 'клавиатура', 'мышь', 'камера', 'часы',
+    'чехол', 'зарядка', 'кабель', 'роутер', 'принтер', 'сканер', 'диван', 'стол', 'стул', 'лампа', 'кресло',
+    'шкаф', 'полка', 'ковер', 'куртка', 'ботинки', 'рюкзак', 'сумка', 'шапка', 'перчатки', 'новый', 'легкий',
+    'прочный', 'быстрый', 'тихий', 'компактный', 'беспроводной', 'черный', 'белый', 'красный', 'большой',
+    'маленький', 'удобный', 'надежный', 'современный', 'классический', 'отличный', 'недорогой', 'мощный',
+)
+MANUFACTURERS = ('Альфа', 'Бета', 'Гамма', 'Дельта', 'Омега', 'Acme', 'Globex', 'Initech', 'Umbrella', 'Stark')
+
+
+class Command(BaseCommand):
+    help = 'Заполнение базы детерминированным синтетическим каталогом для нагрузочных замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--super-categories', type=int, default=5)
+        parser.add_argument('--sub-categories', type=int, default=4, help='Подкатегорий в каждой надкатегории')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--images', type=int, default=2, help='Наибольшее число доп. изображений товара')
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Удалить ранее созданные синтетические данные')
+
+    def text(self, words):
+        return ' '.join(self.rnd.choice(WORDS) for _ in range(words))
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        sellers = AdvUser.objects.filter(username__startswith=USERNAME_PREFIX)
+        if options['clear']:
+            delete_products(Product.objects.filter(seller__in=sellers))
+            sellers.delete()
+        elif sellers.exists():
+            raise CommandError('Синтетические данные уже созданы, используйте --clear')
+
+        with transaction.atomic():
+            categories = []
+            for i in range(options['super_categories']):
+                super_category, _ = SuperCategory.objects.get_or_create(
+                    name=f'Раздел {i + 1}', defaults={'order': 1000 + i}
+                )
+                for j in range(options['sub_categories']):
+                    category, _ = SubCategory.objects.get_or_create(
+                        name=f'Раздел {i + 1}.{j + 1}',
+                        defaults={'order': 2000 + i * 100 + j, 'super_category': super_category},
+                    )
+                    categories.append(category)
+
+            password = make_password(None)
+            AdvUser.objects.bulk_create([
+                AdvUser(username=f'{USERNAME_PREFIX}{i}', email=f'{USERNAME_PREFIX}{i}@example.com',
+                        password=password, send_messages=False)
+                for i in range(options['users'])
+            ], batch_size=batch_size)
+            users = list(sellers.order_by('pk'))
+
+            product_pks = []
+            for start in range(0, options['products'], batch_size):
+                products = [
+                    Product(
+                        category=self.rnd.choice(categories), seller=self.rnd.choice(users),
+                        title=self.text(3)[:40], content=self.text(self.rnd.randint(10, 60)),
+                        price=round(self.rnd.uniform(100, 100000), 2), manufacturer=self.rnd.choice(MANUFACTURERS),
+                        is_active=self.rnd.random() > 0.05,
+                    )
+                    for _ in range(start, min(start + batch_size, options['products']))
+                ]
+                Product.objects.bulk_create(products)
+                products_bulk_created.send(sender=Product, products=products)
+                product_pks.extend(product.pk for product in products)
+                AdditionalImage.objects.bulk_create([
+                    AdditionalImage(product=product, image=f'seed/{product.pk}_{n}.jpg')
+                    for product in products for n in range(self.rnd.randint(0, options['images']))
+                ])
+
+            for start in range(0, options['comments'], batch_size):
+                Comment.objects.bulk_create([
+                    Comment(product_id=self.rnd.choice(product_pks), author=self.rnd.choice(users).username,
+                            content=self.text(self.rnd.randint(5, 30)), is_active=self.rnd.random() > 0.1)
+                    for _ in range(start, min(start + batch_size, options['comments']))
+                ])
+            # Комментарии создаются без сигналов, поэтому счетчики пересчитываются целиком
+            reconcile_counters()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: подкатегорий {len(categories)}, пользователей {len(users)}, '
+            f'товаров {len(product_pks)}, комментариев {options["comments"]}'
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Отправка писем из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=5, help='Пауза при пустой очереди, секунд')
+        parser.add_argument('--once', action='store_true', help='Отправить накопившиеся письма и завершиться')
+
+    def handle(self, *args, **options):
+        while True:
+            claimed, sent = deliver_pending(options['batch_size'])
+            if claimed:
+                self.stdout.write(f'Отправлено писем: {sent} из {claimed}')
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
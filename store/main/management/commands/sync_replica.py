@@ -0,0 +1,25 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Копирование основной БД SQLite в файл реплики, заменяющий реплику при разработке'
+
+    def handle(self, *args, **options):
+        replica = settings.DATABASES.get(settings.REPLICA_DATABASE)
+        default = settings.DATABASES['default']
+        if replica is None:
+            raise CommandError('Реплика не настроена, задайте REPLICA_DATABASE_NAME')
+        if 'sqlite3' not in default['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError('Команда копирует только БД SQLite')
+        source = sqlite3.connect(default['NAME'])
+        target = sqlite3.connect(replica['NAME'])
+        try:
+            # Резервное копирование SQLite не мешает работе с основной БД
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f'Реплика {replica["NAME"]} обновлена'))
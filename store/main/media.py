@@ -0,0 +1,95 @@
+import mimetypes
+import os
+import posixpath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from ranged_response import RangedFileReader, RangedFileResponse
+
+from .storage import content_storage
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class SizedFileReader(RangedFileReader):
+    """RangedFileReader, получающий размер файла из файловой системы, а не чтением всего файла"""
+    def __init__(self, file, size, start=0, stop=float('inf'), block_size=None):
+        self.f = file
+        self.size = size
+        self.block_size = block_size or RangedFileReader.block_size
+        self.start = start
+        self.stop = stop
+
+
+class MediaFileResponse(RangedFileResponse):
+    """Ответ с файлом, поддерживающий запросы диапазона байтов"""
+    def __init__(self, request, file, size, etag, **kwargs):
+        self.ranged_file = SizedFileReader(file, size)
+        super(RangedFileResponse, self).__init__(self.ranged_file, **kwargs)
+        self._resource_closers.append(file.close)
+        self['Accept-Ranges'] = 'bytes'
+        self['Content-Length'] = size
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if 'HTTP_RANGE' in request.META and (if_range is None or if_range == etag):
+            self.add_range_headers(request.META['HTTP_RANGE'])
+
+
+def is_immutable(path):
+    """Содержимое файлов content_storage и их миниатюр не меняется, имя определяется содержимым"""
+    prefix = f'{content_storage.prefix}/'
+    return path.startswith(prefix) or path.startswith(posixpath.join(settings.THUMBNAIL_BASEDIR, prefix))
+
+
+def get_offload_response(path, full_path):
+    """Пустой ответ, передающий отдачу файла фронтальному серверу"""
+    response = HttpResponse()
+    if settings.MEDIA_OFFLOAD == 'nginx':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_LOCATION + quote(path)
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """Отдача медиафайлов с поддержкой диапазонов байтов, ETag и долгосрочного кэширования.
+
+    Если задан MEDIA_OFFLOAD, сам файл отдает фронтальный сервер
+    (nginx через X-Accel-Redirect, Apache и lighttpd через X-Sendfile).
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404()
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404()
+    if not os.path.isfile(full_path):
+        raise Http404()
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or 'application/octet-stream'
+        if settings.MEDIA_OFFLOAD:
+            response = get_offload_response(path, full_path)
+            response['Content-Type'] = content_type
+        else:
+            response = MediaFileResponse(request, open(full_path, 'rb'), stat.st_size, etag,
+                                         content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if is_immutable(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_MAX_AGE)
+    return response
@@ -1,9 +1,19 @@
-from .models import SubCategory
+import asyncio
+
+from django.conf import settings
+from django.urls import resolve, Resolver404
+
+from .caching import category_tree
+from .routers import read_from_replica, replica_enabled
 
 
 def store_context_processor(request):
+    categories_version, categories = category_tree.get_versioned()
     context = {
-        'categories': SubCategory.objects.all(),
+        'categories': categories,
+        # Версия списка категорий и срок хранения для кэширования фрагментов шаблонов
+        'categories_version': categories_version,
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
         'keyword': '',
         'all': '',
     }
@@ -20,4 +30,58 @@ def store_context_processor(request):
                 context['all'] += '&page=' + page
             else:
                 context['all'] += '?page=' + page
+    if 'cursor' in request.GET:
+        cursor = request.GET['cursor']
+        if cursor:
+            if context['all']:
+                context['all'] += '&cursor=' + cursor
+            else:
+                context['all'] += '?cursor=' + cursor
     return context
+
+
+class ReplicaRoutingMiddleware:
+    """Чтение данных каталога с реплики в GET-запросах к контроллерам из settings.REPLICA_READ_VIEWS.
+
+    После запроса, который мог изменить данные, посетитель получает cookie на
+    REPLICA_STICKY_SECONDS секунд, и его запросы читают основную БД, пока
+    реплика не догонит ее (чтение своих записей).
+    """
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'replica_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def use_replica(self, request):
+        if request.method not in ('GET', 'HEAD') or self.cookie_name in request.COOKIES:
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.view_name in settings.REPLICA_READ_VIEWS
+
+    def pin(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(
+                self.cookie_name, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def __call__(self, request):
+        if not replica_enabled():
+            return self.get_response(request)
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with read_from_replica(self.use_replica(request)):
+            response = self.get_response(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        with read_from_replica(self.use_replica(request)):
+            response = await self.get_response(request)
+        return self.pin(request, response)
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
+from .storage import content_storage
 from .utilites import get_timestamp_path
 
 
@@ -11,9 +13,9 @@ class AdvUser(AbstractUser):
     )
 
     def delete(self, *args, **kwargs):
-        for product in self.product_set.all():
-            product.delete()
-        super().delete(*args, **kwargs)
+        from .deletion import delete_products
+        delete_products(self.product_set.all())
+        return super().delete(*args, **kwargs)
 
     class Meta(AbstractUser.Meta):
         pass
@@ -27,6 +29,7 @@ class Category(models.Model):
         'SuperCategory', on_delete=models.PROTECT, null=True,
         blank=True, verbose_name='Категория товаров'
     )
+    product_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Товаров')
 
 
 class SuperCategoryManager(models.Manager):
@@ -75,25 +78,44 @@ class Product(models.Model):
     content = models.TextField(verbose_name='Описание товара')
     price = models.FloatField(default=0, verbose_name='Цена')
     manufacturer = models.CharField(max_length=50, verbose_name='Производитель')
-    image = models.ImageField(blank=True, upload_to=get_timestamp_path, verbose_name='Изображение')
+    image = models.ImageField(
+        blank=True, db_index=True, upload_to=get_timestamp_path, storage=content_storage,
+        verbose_name='Изображение'
+    )
     seller = models.ForeignKey(AdvUser, on_delete=models.CASCADE, verbose_name='Продавец')
     is_active = models.BooleanField(default=True, db_index=True, verbose_name='Наличие товара')
     created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Добавлено')
+    comment_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменено')
+
+    @property
+    def fragment_version(self):
+        """Версия для ключей кэшированных фрагментов; счетчик комментариев меняется без сохранения товара"""
+        return f'{self.updated_at.timestamp()}-{self.comment_count}'
 
     def delete(self, *args, **kwargs):
-        for image in self.additionalimage_set.all():
-            image.delete()
-        super().delete(*args, **kwargs)
+        from .deletion import delete_additional_images
+        delete_additional_images(self.additionalimage_set.all())
+        return super().delete(*args, **kwargs)
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['category', 'is_active', '-created_at', '-id'], name='product_category_keyset_idx'),
+            models.Index(fields=['-created_at', '-id'], name='product_keyset_idx'),
+            models.Index(fields=['seller', '-created_at', '-id'], name='product_seller_keyset_idx'),
+            # Покрывающий индекс для подсчета фасетов товаров категории
+            models.Index(fields=['category', 'is_active', 'manufacturer', 'price'], name='product_facet_idx'),
+        ]
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
 
 
 class AdditionalImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='Товар')
-    image = models.ImageField(upload_to=get_timestamp_path, verbose_name='Изображение')
+    image = models.ImageField(
+        db_index=True, upload_to=get_timestamp_path, storage=content_storage, verbose_name='Изображение'
+    )
 
     class Meta:
         verbose_name = 'Дополнительное изображение'
@@ -108,6 +130,72 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Добавлено')
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['product', 'is_active', '-created_at', '-id'], name='comment_product_keyset_idx'),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+
+
+class SellerStats(models.Model):
+    """Сводка по товарам продавца, обновляемая при изменении товаров и комментариев"""
+    seller = models.OneToOneField(
+        AdvUser, on_delete=models.CASCADE, primary_key=True, related_name='stats', verbose_name='Продавец'
+    )
+    active_products = models.PositiveIntegerField(default=0, verbose_name='Товаров в наличии')
+    inactive_products = models.PositiveIntegerField(default=0, verbose_name='Товаров нет в наличии')
+    comment_count = models.PositiveIntegerField(default=0, verbose_name='Комментариев к товарам')
+    last_activity_at = models.DateTimeField(null=True, blank=True, verbose_name='Последняя активность')
+
+    class Meta:
+        verbose_name = 'Статистика продавца'
+        verbose_name_plural = 'Статистика продавцов'
+
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди на отправку"""
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Не отправлено'),
+    )
+
+    dedup_key = models.CharField(max_length=100, verbose_name='Ключ')
+    to = models.EmailField(verbose_name='Получатель')
+    subject = models.CharField(max_length=255, verbose_name='Тема')
+    body = models.TextField(verbose_name='Текст')
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING, verbose_name='Состояние')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Следующая попытка')
+    claim = models.UUIDField(null=True, blank=True, editable=False)
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Добавлено')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Отправлено')
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_queue_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'], condition=models.Q(status='pending'), name='outgoing_email_pending_unique'
+            ),
+        ]
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+
+
+class DeletedFile(models.Model):
+    """Файл удаленной записи, ожидающий удаления из хранилища"""
+    field = models.CharField(max_length=100, verbose_name='Поле')
+    name = models.CharField(max_length=255, verbose_name='Файл')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Добавлено')
+
+    class Meta:
+        verbose_name = 'Удаленный файл'
+        verbose_name_plural = 'Удаленные файлы'
@@ -0,0 +1,116 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+def enqueue_email(to, subject, body, dedup_key):
+    """Постановка письма в очередь; повтор письма с тем же ключом, еще не отправленного, пропускается"""
+    enqueue_emails([OutgoingEmail(to=to, subject=subject, body=body, dedup_key=dedup_key)])
+
+
+def enqueue_emails(emails):
+    """Постановка в очередь набора писем (несохраненных OutgoingEmail) одним запросом"""
+    OutgoingEmail.objects.bulk_create(emails, ignore_conflicts=True)
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед очередной попыткой"""
+    return timedelta(seconds=min(settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1),
+                                 settings.EMAIL_OUTBOX_MAX_RETRY_DELAY))
+
+
+def claim_batch(batch_size, **filters):
+    """Захват пачки писем одним обработчиком, filters дополнительно ограничивают выбор писем.
+
+    Захваченные письма откладываются на время аренды, поэтому после сбоя
+    обработчика они снова попадут в очередь.
+    """
+    now = timezone.now()
+    pks = list(OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=now, **filters)
+               .values_list('pk', flat=True)[:batch_size])
+    if not pks:
+        return []
+    claim = uuid.uuid4()
+    OutgoingEmail.objects.filter(pk__in=pks, status=OutgoingEmail.PENDING, next_attempt_at__lte=now).update(
+        claim=claim, next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+    )
+    return list(OutgoingEmail.objects.filter(claim=claim))
+
+
+def deliver(emails, connection=None):
+    """Отправка писем через одно SMTP-соединение, возвращает число отправленных.
+
+    Уже открытое соединение connection не закрывается.
+    """
+    sent = []
+    connection = connection or get_connection()
+    try:
+        opened = connection.open()
+    except Exception as e:
+        for email in emails:
+            _failed(email, e)
+        return 0
+    try:
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.to],
+                                   connection=connection)
+            try:
+                message.send()
+            except Exception as e:
+                _failed(email, e)
+            else:
+                sent.append(email.pk)
+    finally:
+        if opened:
+            connection.close()
+    OutgoingEmail.objects.filter(pk__in=sent).update(
+        status=OutgoingEmail.SENT, sent_at=timezone.now(), claim=None, last_error=''
+    )
+    return len(sent)
+
+
+def _failed(email, error):
+    email.attempts += 1
+    email.last_error = repr(error)
+    email.claim = None
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=('attempts', 'last_error', 'claim', 'status', 'next_attempt_at'))
+
+
+def deliver_now(dedup_keys, batch_size=100):
+    """Немедленная отправка писем из очереди с ключами dedup_keys через одно SMTP-соединение.
+
+    Письма захватываются пачками, как обработчиком очереди, поэтому не
+    будут отправлены дважды; неотправленные остаются в очереди.
+    Возвращает (захвачено, отправлено).
+    """
+    claimed = sent = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception:
+        return claimed, sent
+    try:
+        for start in range(0, len(dedup_keys), batch_size):
+            emails = claim_batch(batch_size, dedup_key__in=dedup_keys[start:start + batch_size])
+            claimed += len(emails)
+            sent += deliver(emails, connection)
+    finally:
+        connection.close()
+    return claimed, sent
+
+
+def deliver_pending(batch_size=100):
+    """Отправка одной пачки писем из очереди, возвращает (захвачено, отправлено)"""
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0, 0
+    return len(emails), deliver(emails)
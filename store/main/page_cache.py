@@ -0,0 +1,135 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.utils.http import urlencode
+
+from .apps import products_bulk_created, products_bulk_deleted, comments_bulk_created, thumbnails_generated
+from .caching import CATEGORIES_VERSION, get_versions, bump_version
+from .conditional import has_pending_messages
+from .models import Product, AdditionalImage, Comment
+from .routers import read_from_replica
+
+INDEX_TAG = 'page:index'
+
+
+def category_tag(pk):
+    return f'page:category:{pk}'
+
+
+def product_tag(pk):
+    return f'page:product:{pk}'
+
+
+def get_cache_key(request, params, tags):
+    """Ключ страницы: путь, учитываемые параметры запроса и версии тегов.
+
+    После смены версии любого из тегов ключ меняется, и старая запись
+    больше не читается, а затем вытесняется по истечении срока хранения.
+    """
+    query = urlencode(sorted((name, value) for name in params for value in request.GET.getlist(name)))
+    versions = '-'.join(map(str, get_versions(*tags)))
+    url = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'page:{url}:{versions}'
+
+
+def is_cacheable(request):
+    return request.method in ('GET', 'HEAD') and not request.user.is_authenticated \
+        and not has_pending_messages(request)
+
+
+def cache_page_for_anonymous(get_tags, params=()):
+    """Кэширование страниц для анонимных посетителей со сбросом по тегам.
+
+    get_tags - функция, получающая аргументы контроллера и возвращающая теги
+    страницы; params - параметры запроса, от которых зависит страница.
+    Страницы с формами, использующими CSRF-токен, не кэшируются.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return view(request, *args, **kwargs)
+            key = get_cache_key(request, params, (CATEGORIES_VERSION, *get_tags(*args, **kwargs)))
+            response = cache.get(key)
+            if response is None:
+                # Запись в кэше живет до смены версии, поэтому страница строится по основной БД,
+                # а не по реплике, которая может отставать от уже смененной версии
+                with read_from_replica(False):
+                    response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.cookies \
+                        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+                    cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def bump_tags(tags):
+    for tag in set(tags):
+        bump_version(tag)
+
+
+def product_changed_dispatcher(sender, **kwargs):
+    instance = kwargs['instance']
+    tags = [INDEX_TAG, product_tag(instance.pk), category_tag(instance.category_id)]
+    # Значения полей до сохранения запоминаются в main.counters
+    saved_state = getattr(instance, '_saved_state', None)
+    if saved_state is not None:
+        tags.append(category_tag(saved_state['category_id']))
+    bump_tags(tags)
+
+
+def image_changed_dispatcher(sender, **kwargs):
+    bump_tags([product_tag(kwargs['instance'].product_id)])
+
+
+def comment_changed_dispatcher(sender, **kwargs):
+    # Число комментариев выводится и в списках товаров
+    product = kwargs['instance'].product
+    bump_tags([INDEX_TAG, product_tag(product.pk), category_tag(product.category_id)])
+
+
+def comments_bulk_created_dispatcher(sender, **kwargs):
+    products = {comment.product_id: comment.product for comment in kwargs['comments']}
+    bump_tags(
+        [INDEX_TAG]
+        + [product_tag(pk) for pk in products]
+        + [category_tag(product.category_id) for product in products.values()]
+    )
+
+
+def products_bulk_created_dispatcher(sender, **kwargs):
+    products = kwargs['products']
+    bump_tags([INDEX_TAG] + [category_tag(product.category_id) for product in products])
+
+
+def products_bulk_deleted_dispatcher(sender, **kwargs):
+    bump_tags(
+        [INDEX_TAG]
+        + [product_tag(pk) for pk in kwargs['pks']]
+        + [category_tag(pk) for pk in kwargs['categories']]
+    )
+
+
+def thumbnails_generated_dispatcher(sender, **kwargs):
+    products = kwargs['products']
+    bump_tags(
+        [INDEX_TAG]
+        + [product_tag(pk) for pk, category_id in products]
+        + [category_tag(category_id) for pk, category_id in products]
+    )
+
+
+post_save.connect(product_changed_dispatcher, sender=Product)
+post_delete.connect(product_changed_dispatcher, sender=Product)
+post_save.connect(image_changed_dispatcher, sender=AdditionalImage)
+post_delete.connect(image_changed_dispatcher, sender=AdditionalImage)
+post_save.connect(comment_changed_dispatcher, sender=Comment)
+post_delete.connect(comment_changed_dispatcher, sender=Comment)
+comments_bulk_created.connect(comments_bulk_created_dispatcher)
+products_bulk_created.connect(products_bulk_created_dispatcher)
+products_bulk_deleted.connect(products_bulk_deleted_dispatcher)
+thumbnails_generated.connect(thumbnails_generated_dispatcher)
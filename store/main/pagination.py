@@ -0,0 +1,157 @@
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections, transaction, DatabaseError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+    """Страница, полученная по ключу сортировки"""
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Постраничный вывод по значениям полей сортировки без COUNT и OFFSET.
+
+    Курсор хранит значения полей сортировки последней (или первой) записи
+    страницы и подписывается, поэтому клиент не может его подделать.
+    """
+    salt = 'main.pagination'
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id')):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+
+    def encode_cursor(self, obj, backward):
+        if isinstance(obj, dict):
+            # Строка .values() должна содержать поля сортировки
+            obj = self.queryset.model(**{field.attname: obj[field.attname] for field in self.fields})
+        values = [field.value_to_string(obj) for field in self.fields]
+        return signing.dumps([values, backward], salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            values, backward = signing.loads(cursor, salt=self.salt)
+            if len(values) != len(self.fields):
+                raise ValueError(cursor)
+            values = [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (signing.BadSignature, ValidationError, ValueError, TypeError) as e:
+            raise InvalidPage('Неверный курсор') from e
+        return values, bool(backward)
+
+    def _after(self, values, backward):
+        """Условие отбора записей, следующих за курсором в направлении обхода"""
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, values):
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            lookup = 'lt' if descending != backward else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _page_queryset(self, cursor):
+        """Запрос записей страницы с одной лишней записью для проверки наличия следующей"""
+        if cursor:
+            values, backward = self.decode_cursor(cursor)
+        else:
+            values, backward = None, False
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backward))
+        ordering = self.ordering
+        if backward:
+            ordering = [name[1:] if name.startswith('-') else '-' + name for name in ordering]
+        return queryset.order_by(*ordering)[:self.per_page + 1], values, backward
+
+    def page(self, cursor=None):
+        queryset, values, backward = self._page_queryset(cursor)
+        return self._make_page(list(queryset), values, backward)
+
+    async def apage(self, cursor=None):
+        queryset, values, backward = self._page_queryset(cursor)
+        return self._make_page([obj async for obj in queryset], values, backward)
+
+    def _make_page(self, object_list, values, backward):
+        has_more = len(object_list) > self.per_page
+        del object_list[self.per_page:]
+        if backward:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        next_cursor = previous_cursor = None
+        if object_list:
+            if has_next:
+                next_cursor = self.encode_cursor(object_list[-1], False)
+            if has_previous:
+                previous_cursor = self.encode_cursor(object_list[0], True)
+        return KeysetPage(object_list, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        """Страница по курсору, при неверном курсоре - первая страница"""
+        try:
+            return self.page(cursor)
+        except InvalidPage:
+            return self.page()
+
+
+def estimated_count(model, using='default'):
+    """Оценка числа записей таблицы по статистике БД без полного подсчета, None, если статистики нет.
+
+    Для SQLite статистика собирается командой ANALYZE (или PRAGMA optimize).
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+    else:
+        return None
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    count = int(str(row[0]).split()[0])
+    return count if count >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, использующий для больших таблиц без условий отбора оценку числа записей вместо COUNT"""
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
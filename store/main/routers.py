@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def replica_enabled():
+    """Настроена ли реплика, отличная от основной БД (в тестах реплика совпадает с основной БД)"""
+    if settings.REPLICA_DATABASE not in settings.DATABASES:
+        return False
+    return connections[settings.REPLICA_DATABASE].settings_dict['NAME'] \
+        != connections['default'].settings_dict['NAME']
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    """Чтение данных каталога с реплики (или, при enabled=False, с основной БД) в пределах блока"""
+    token = _read_from_replica.set(enabled and replica_enabled())
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Чтение данных каталога с реплики, если это разрешено для текущего запроса.
+
+    Все записи, миграции и чтение остальных моделей (пользователи, сессии и
+    т. д.) выполняются в основной БД.
+    """
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and model._meta.concrete_model._meta.label in settings.REPLICA_MODELS:
+            return settings.REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != settings.REPLICA_DATABASE
@@ -0,0 +1,251 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.utils.module_loading import import_string
+
+from .apps import products_bulk_created, products_bulk_deleted
+from .models import Product
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = {
+    'в': True, 'вши': True, 'вшись': True,
+    'ив': False, 'ивши': False, 'ившись': False, 'ыв': False, 'ывши': False, 'ывшись': False,
+}
+ADJECTIVE = dict.fromkeys((
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+), False)
+PARTICIPLE = {
+    'ем': True, 'нн': True, 'вш': True, 'ющ': True, 'щ': True,
+    'ивш': False, 'ывш': False, 'ующ': False,
+}
+REFLEXIVE = {'ся': False, 'сь': False}
+VERB = {
+    **dict.fromkeys((
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ), True),
+    **dict.fromkeys((
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+        'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ), False),
+}
+NOUN = dict.fromkeys((
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й',
+    'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+), False)
+
+
+def _endings(endings):
+    """Окончания группы от длинных к коротким с признаком обязательной а/я перед окончанием"""
+    return sorted(endings.items(), key=lambda item: len(item[0]), reverse=True)
+
+
+PERFECTIVE_GERUND, ADJECTIVE, PARTICIPLE, REFLEXIVE, VERB, NOUN = map(
+    _endings, (PERFECTIVE_GERUND, ADJECTIVE, PARTICIPLE, REFLEXIVE, VERB, NOUN)
+)
+SUPERLATIVE = _endings({'ейш': False, 'ейше': False})
+
+
+def _among(word, endings):
+    """Отсечение самого длинного окончания из группы, None если окончание не найдено"""
+    for ending, after_a in endings:
+        if word.endswith(ending):
+            stem = word[:-len(ending)]
+            if after_a and not stem.endswith(('а', 'я')):
+                return None
+            return stem
+    return None
+
+
+def _region(word, start):
+    """Начало области после первой согласной, следующей за гласной"""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """Стемминг русского слова по алгоритму Snowball"""
+    word = word.lower().replace('ё', 'е')
+    rv_start = next((i + 1 for i, char in enumerate(word) if char in VOWELS), len(word))
+    r2_start = _region(word, _region(word, 0))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    stemmed = _among(rv, PERFECTIVE_GERUND)
+    if stemmed is None:
+        reflexive = _among(rv, REFLEXIVE)
+        if reflexive is not None:
+            rv = reflexive
+        stemmed = _among(rv, ADJECTIVE)
+        if stemmed is not None:
+            participle = _among(stemmed, PARTICIPLE)
+            if participle is not None:
+                stemmed = participle
+        else:
+            stemmed = _among(rv, VERB)
+            if stemmed is None:
+                stemmed = _among(rv, NOUN)
+    if stemmed is not None:
+        rv = stemmed
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    for ending in ('ость', 'ост'):
+        if rv.endswith(ending) and rv_start + len(rv) - len(ending) >= r2_start:
+            rv = rv[:-len(ending)]
+            break
+
+    superlative = _among(rv, SUPERLATIVE)
+    if superlative is not None:
+        rv = superlative
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    elif superlative is None and rv.endswith('ь'):
+        rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    return [stem(token) for token in re.findall(r'\w+', text.lower())]
+
+
+class BaseSearchBackend:
+    """Интерфейс поискового движка по товарам"""
+    def setup(self):
+        pass
+
+    def index(self, products):
+        raise NotImplementedError
+
+    def remove(self, pks):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, queryset, query):
+        """Отбор товаров из queryset по запросу с сортировкой по релевантности"""
+        raise NotImplementedError
+
+    def rebuild(self, queryset, batch_size=1000):
+        self.setup()
+        self.clear()
+        count = 0
+        batch = []
+        for product in queryset.only('pk', 'title', 'content').iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) == batch_size:
+                self.index(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.index(batch)
+            count += len(batch)
+        return count
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Поиск подстрокой без отдельного индекса"""
+    def index(self, products):
+        pass
+
+    def remove(self, pks):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, queryset, query):
+        for word in query.split():
+            queryset = queryset.filter(Q(title__icontains=word) | Q(content__icontains=word))
+        return queryset
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Полнотекстовый поиск на индексе SQLite FTS5 с ранжированием bm25"""
+    table = 'main_product_search'
+    title_weight = 10.0
+    content_weight = 1.0
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5('
+                f"title, content, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+
+    def index(self, products):
+        rows = [(product.pk, ' '.join(tokenize(product.title)), ' '.join(tokenize(product.content)))
+                for product in products]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(f'INSERT INTO {self.table} (rowid, title, content) VALUES (%s, %s, %s)', rows)
+
+    def remove(self, pks):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in pks])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def build_query(self, query):
+        """Запрос FTS5: все основы слов запроса с поиском по префиксу"""
+        return ' '.join('"%s"*' % token.replace('"', '""') for token in tokenize(query))
+
+    def search(self, queryset, query):
+        match = self.build_query(query)
+        if not match:
+            return queryset
+        return queryset.extra(
+            tables=[self.table],
+            where=[f'{self.table}.rowid = {queryset.model._meta.db_table}.id', f'{self.table} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'bm25({self.table}, {self.title_weight}, {self.content_weight})'},
+            order_by=['search_rank'],
+        )
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+def search_products(queryset, query):
+    if not query.strip():
+        return queryset
+    return get_backend().search(queryset, query)
+
+
+def search_setup_dispatcher(sender, **kwargs):
+    get_backend().setup()
+
+
+def product_saved_dispatcher(sender, **kwargs):
+    get_backend().index([kwargs['instance']])
+
+
+def product_deleted_dispatcher(sender, **kwargs):
+    get_backend().remove([kwargs['instance'].pk])
+
+
+def products_bulk_created_dispatcher(sender, **kwargs):
+    get_backend().index(kwargs['products'])
+
+
+def products_bulk_deleted_dispatcher(sender, **kwargs):
+    get_backend().remove(kwargs['pks'])
+
+
+post_save.connect(product_saved_dispatcher, sender=Product)
+post_delete.connect(product_deleted_dispatcher, sender=Product)
+products_bulk_created.connect(products_bulk_created_dispatcher)
+products_bulk_deleted.connect(products_bulk_deleted_dispatcher)
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import posixpath
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, именующее файлы по SHA-256 содержимого.
+
+    Файл сохраняется как <каталог>/<ab>/<cd>/<хеш><расширение>, где ab и cd -
+    первые символы хеша, поэтому в каждом каталоге остается ограниченное
+    число файлов. Одинаковое содержимое хранится один раз, а файл удаляется,
+    только когда на него не ссылается ни одна запись (в том числе при
+    удалении через django_cleanup). Имена не меняются, поэтому при
+    инкрементном резервном копировании файлы не копируются повторно.
+
+    Запись, сохраняющая уже существующий файл, фиксируется позже сохранения
+    файла, поэтому файлы, записанные или повторно загруженные менее
+    CONTENT_STORAGE_GRACE_SECONDS секунд назад, не удаляются.
+    """
+    def __init__(self, prefix='images', **kwargs):
+        self.prefix = prefix
+        super().__init__(**kwargs)
+
+    def get_hash(self, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_hashed_name(self, name, digest):
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(self.prefix, digest[:2], digest[2:4], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым, совпадение имен означает совпадение файлов
+        return name
+
+    def _save(self, name, content):
+        name = self.get_hashed_name(name, self.get_hash(content))
+        if self.exists(name):
+            # Повторная загрузка откладывает удаление файла, см. is_recent
+            os.utime(self.path(name))
+            return name
+        # Запись во временный файл и переименование, чтобы одновременные загрузки
+        # одного и того же файла не мешали друг другу
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+    def get_fields(self):
+        """Поля файлов всех моделей, использующие это хранилище"""
+        return [
+            field
+            for model in apps.get_models()
+            if not model._meta.proxy
+            for field in model._meta.get_fields()
+            if isinstance(field, models.FileField) and field.storage is self
+        ]
+
+    def is_referenced(self, name):
+        return any(
+            field.model._base_manager.filter(**{field.name: name}).exists()
+            for field in self.get_fields()
+        )
+
+    def is_recent(self, name):
+        """Файл записан или повторно загружен недавно: ссылающаяся на него запись может быть еще не зафиксирована"""
+        try:
+            return time.time() - os.path.getmtime(self.path(name)) < settings.CONTENT_STORAGE_GRACE_SECONDS
+        except OSError:
+            return False
+
+    def try_delete(self, name, before_delete=None):
+        """Удаление файла, на который не ссылается ни одна запись, возвращает True, если файл удален.
+
+        Ссылки проверяются и файл удаляется в одной транзакции; before_delete
+        (например, удаление миниатюр) вызывается только для удаляемого файла.
+        """
+        with transaction.atomic():
+            if self.is_referenced(name) or self.is_recent(name):
+                return False
+            if before_delete is not None:
+                before_delete()
+            super().delete(name)
+        return True
+
+    def delete(self, name):
+        self.try_delete(name)
+
+
+content_storage = ContentAddressedStorage()
@@ -0,0 +1,67 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from easy_thumbnails.alias import aliases
+
+from main.thumbnails import get_format_thumbnailer, schedule_missing_thumbnails
+
+register = template.Library()
+
+
+def _options(thumbnailer, alias):
+    return dict(aliases.get(alias, target=thumbnailer.alias_target), ALIAS=alias)
+
+
+def _thumbnail_urls(image, alias):
+    """URL миниатюры alias и URL миниатюр для плотностей экрана по форматам (None - формат по умолчанию).
+
+    Миниатюры не создаются при выводе страницы. Все миниатюры файла создает
+    одна задача generate_thumbnails, поэтому проверяется наличие только одной
+    из них, а имена остальных вычисляются без обращения к хранилищу.
+    Возвращает (None, None), если миниатюр еще нет.
+    """
+    thumbnailer = get_format_thumbnailer(image)
+    existing = thumbnailer.get_existing_thumbnail(_options(thumbnailer, alias))
+    if existing is None:
+        return None, None
+    transparent = existing.name != thumbnailer.get_thumbnail_name(_options(thumbnailer, alias))
+    urls = {}
+    for extension in (None,) + tuple(settings.THUMBNAIL_SOURCE_FORMATS):
+        thumbnailer = get_format_thumbnailer(image, extension)
+        urls[extension] = [
+            (thumbnailer.thumbnail_storage.url(
+                thumbnailer.get_thumbnail_name(_options(thumbnailer, density_alias), transparent)
+            ), density)
+            for density, density_alias in settings.THUMBNAIL_SRCSET[alias].items()
+        ]
+    return existing.url, urls
+
+
+def _srcset(urls):
+    return format_html_join(', ', '{} {}', urls)
+
+
+@register.simple_tag
+def thumbnail_picture(image, alias, css_class=''):
+    """Миниатюра в теге <picture> с вариантами в форматах THUMBNAIL_SOURCE_FORMATS и srcset для плотностей экрана.
+
+    Пока миниатюры не созданы, выводится исходное изображение, а создание
+    миниатюр ставится в фоновую очередь.
+    """
+    if not image:
+        return format_html('<img class="{}" src="{}">', css_class, static('main/empty.jpg'))
+    try:
+        src, urls = _thumbnail_urls(image, alias)
+    except Exception:
+        src, urls = None, None
+    if src is None:
+        schedule_missing_thumbnails(image)
+        return format_html('<img class="{}" src="{}">', css_class, image.url)
+    sources = format_html_join('', '<source type="image/{}" srcset="{}">', (
+        (extension, _srcset(urls[extension])) for extension in settings.THUMBNAIL_SOURCE_FORMATS
+    ))
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" srcset="{}"></picture>',
+        sources, css_class, src, _srcset(urls[None]),
+    )
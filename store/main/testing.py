@@ -0,0 +1,31 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from .routers import replica_enabled
+
+
+class QueryBudgetMixin:
+    """Проверка числа запросов к БД при обращении к контроллеру.
+
+    Бюджет берется из аргумента max_queries или из settings.QUERY_BUDGETS
+    по имени контроллера, обработавшего запрос. Учитываются запросы и к
+    основной БД, и к реплике.
+    """
+    def assertQueryBudget(self, url, max_queries=None, method='get', **kwargs):
+        aliases = ['default']
+        if replica_enabled():
+            aliases.append(settings.REPLICA_DATABASE)
+        with ExitStack() as stack:
+            contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in aliases]
+            response = getattr(self.client, method)(url, **kwargs)
+        captured = [query for context in contexts for query in context.captured_queries]
+        view_name = response.resolver_match.view_name
+        if max_queries is None:
+            max_queries = settings.QUERY_BUDGETS[view_name]
+        if len(captured) > max_queries:
+            queries = '\n'.join(query['sql'] for query in captured)
+            self.fail(f'{view_name}: {len(captured)} запросов при бюджете {max_queries}\n{queries}')
+        return response
@@ -1,3 +1,602 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from easy_thumbnails.files import Thumbnailer
+from PIL import Image
+
+from .caching import category_tree
+from .counters import reconcile_counters, update_counters
+from .deletion import cleanup_files, delete_products, delete_user
+from .loaders import COMMENTS_PER_PAGE
+from .models import (
+    AdvUser, SuperCategory, SubCategory, Product, AdditionalImage, Comment, OutgoingEmail, DeletedFile, SellerStats,
+)
+from .outbox import enqueue_email, claim_batch, deliver_pending, retry_delay
+from .routers import ReplicaRouter, read_from_replica
+from .search import search_products, stem
+from .storage import content_storage
+from .templatetags.pictures import thumbnail_picture
+from .testing import QueryBudgetMixin
+from .throttling import TokenBucket
+from .thumbnails import generate_thumbnails
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdvUser.objects.create_user('seller', 'seller@example.com', 'password')
+        super_category = SuperCategory.objects.create(name='Электроника', order=1)
+        categories = [
+            SubCategory.objects.create(name=f'Раздел {i}', order=i + 2, super_category=super_category)
+            for i in range(5)
+        ]
+        for i in range(20):
+            product = Product.objects.create(
+                category=categories[i % 5], title=f'Товар {i}', content='Описание', price=i,
+                manufacturer='Производитель', seller=seller,
+            )
+            for j in range(3):
+                Comment.objects.create(product=product, author='Гость', content=f'Комментарий {j}')
+        cls.category = categories[0]
+        cls.product = Product.objects.filter(category=cls.category).first()
+
+    def setUp(self):
+        cache.clear()
+        self.client.get(reverse('main:index'))
+
+    def test_index(self):
+        self.assertQueryBudget(reverse('main:index'))
+
+    def test_by_category(self):
+        self.assertQueryBudget(reverse('main:by_category', kwargs={'pk': self.category.pk}))
+
+    def test_detail(self):
+        url = reverse('main:detail', kwargs={'category_pk': self.category.pk, 'pk': self.product.pk})
+        self.assertQueryBudget(url)
+
+    def test_detail_checks_category(self):
+        url = reverse('main:detail', kwargs={'category_pk': self.category.pk + 1, 'pk': self.product.pk})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_comments_fragment(self):
+        Comment.objects.bulk_create(
+            Comment(product=self.product, author='Гость', content=f'Еще {i}') for i in range(COMMENTS_PER_PAGE)
+        )
+        url = reverse('main:detail', kwargs={'category_pk': self.category.pk, 'pk': self.product.pk})
+        page = self.client.get(url).context['comments']
+        self.assertEqual(len(page), COMMENTS_PER_PAGE)
+        url = reverse('main:comments', kwargs={'category_pk': self.category.pk, 'pk': self.product.pk})
+        response = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertEqual(len(response.context['comments']), 3)
+        self.assertFalse(response.context['comments'].has_next())
+
+    def test_profile_stats(self):
+        seller = AdvUser.objects.get(username='seller')
+        self.product.is_active = False
+        self.product.save()
+        delete_products(Product.objects.filter(pk=Product.objects.exclude(pk=self.product.pk).first().pk))
+        Comment.objects.create(product=self.product, author='Гость', content='Новый')
+        self.client.force_login(seller)
+        response = self.client.get(reverse('main:profile'))
+        stats = response.context['stats']
+        self.assertEqual((stats.active_products, stats.inactive_products, stats.comment_count), (18, 1, 58))
+        self.assertEqual(len(response.context['products']), 10)
+        response = self.client.get(reverse('main:profile'), {'cursor': response.context['page'].next_cursor})
+        self.assertEqual(len(response.context['products']), 9)
+        self.assertEqual(reconcile_counters()['sellers'], 0)
+
+    def test_comment_shown_after_post(self):
+        caches['throttle'].clear()
+        self.client.force_login(AdvUser.objects.get(username='seller'))
+        url = reverse('main:detail', kwargs={'category_pk': self.category.pk, 'pk': self.product.pk})
+        response = self.client.post(url, {'product': self.product.pk, 'author': 'seller', 'content': 'Новый комментарий'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(next(iter(response.context['comments'])).content, 'Новый комментарий')
+        self.assertEqual(response.context['product'].comment_count, 4)
+        self.assertContains(response, 'Новый комментарий')
+
+    @override_settings(THROTTLE_RATES={'comment': '1/m'})
+    def test_comment_form_throttled(self):
+        caches['throttle'].clear()
+        url = reverse('main:detail', kwargs={'category_pk': self.category.pk, 'pk': self.product.pk})
+        data = {'product': self.product.pk, 'author': 'Гость', 'content': 'Текст'}
+        self.assertEqual(self.client.post(url, data).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post(url, data).status_code, 429)
+
+    def test_nav_loaded_once(self):
+        cache.clear()
+        self.assertQueryBudget(reverse('main:index'), max_queries=2)
+        response = self.assertQueryBudget(reverse('main:index'), max_queries=1)
+        self.assertIn('Server-Timing', response)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = AdvUser.objects.create_user('seller', 'seller@example.com', 'password')
+        super_category = SuperCategory.objects.create(name='Электроника', order=1)
+        cls.category = SubCategory.objects.create(name='Телефоны', order=2, super_category=super_category)
+        cls.in_content = Product.objects.create(
+            category=cls.category, title='Чехол', content='Подходит для красного телефона', price=1, seller=seller,
+        )
+        cls.in_title = Product.objects.create(
+            category=cls.category, title='Красный телефон', content='Описание', price=2, seller=seller,
+        )
+        Product.objects.create(category=cls.category, title='Зарядка', content='Описание', price=3, seller=seller)
+
+    def search(self, query):
+        return list(search_products(Product.objects.all(), query))
+
+    def test_stem(self):
+        self.assertEqual(stem('телефоны'), stem('телефон'))
+        self.assertEqual(stem('красная'), stem('красный'))
+        self.assertEqual(stem('Ёлки'), stem('елка'))
+
+    def test_word_forms_ranked_by_title(self):
+        self.assertEqual(self.search('красные телефоны'), [self.in_title, self.in_content])
+        self.assertEqual(self.search('телеф'), [self.in_title, self.in_content])
+        self.assertEqual(self.search('  '), list(Product.objects.all()))
+
+    def test_index_follows_changes(self):
+        self.in_title.title = 'Синий смартфон'
+        self.in_title.save()
+        self.assertEqual(self.search('смартфоны'), [self.in_title])
+        self.assertEqual(self.search('красный'), [self.in_content])
+        delete_products(Product.objects.filter(pk=self.in_content.pk))
+        self.assertEqual(self.search('телефон'), [])
+
+
+class MediaServeTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        with open(os.path.join(media_root.name, 'file.txt'), 'wb') as file:
+            file.write(b'0123456789')
+        self.url = reverse('media', kwargs={'path': 'file.txt'})
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_offload(self):
+        with override_settings(MEDIA_OFFLOAD='nginx', MEDIA_ACCEL_LOCATION='/protected/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/file.txt')
+        self.assertEqual(response.content, b'')
+
+    def test_outside_media_root(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name, THUMBNAIL_WORKERS=0)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        cache.clear()
+        seller = AdvUser.objects.create_user('seller', 'seller@example.com', 'password')
+        super_category = SuperCategory.objects.create(name='Электроника', order=1)
+        category = SubCategory.objects.create(name='Телефоны', order=2, super_category=super_category)
+        content = io.BytesIO()
+        Image.new('RGB', (300, 200), 'red').save(content, 'JPEG')
+        self.product = Product.objects.create(
+            category=category, title='Телефон', content='Описание', price=1, seller=seller,
+            image=ContentFile(content.getvalue(), 'photo.jpg'),
+        )
+
+    def test_render_does_not_generate(self):
+        with mock.patch.object(Thumbnailer, 'generate_thumbnail', side_effect=AssertionError), \
+                mock.patch('main.thumbnails.threading.Thread') as thread:
+            html = thumbnail_picture(self.product.image, 'default')
+            thumbnail_picture(self.product.image, 'default')
+        self.assertIn(self.product.image.url, html)
+        # Повторный вывод не ставит файл в очередь второй раз
+        thread.assert_called_once()
+        generate_thumbnails('main.Product', 'image', self.product.image.name)
+        with mock.patch.object(Thumbnailer, 'generate_thumbnail', side_effect=AssertionError):
+            html = thumbnail_picture(self.product.image, 'default')
+        self.assertIn('<source type="image/webp"', html)
+        self.assertNotIn(f'src="{self.product.image.url}"', html)
+
+    def test_cached_pages_updated_after_generation(self):
+        url = reverse('main:by_category', kwargs={'pk': self.product.category_id})
+        seller = AdvUser.objects.get(username='seller')
+        with mock.patch('main.thumbnails.threading.Thread'):
+            response = self.client.get(url)
+            self.client.force_login(seller)
+            self.assertNotContains(self.client.get(url), '<picture')
+            self.client.logout()
+        self.assertNotContains(response, '<picture')
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_thumbnails('main.Product', 'image', self.product.image.name)
+        # Страница для анонимных посетителей, ее ETag и фрагмент карточки товара сменились
+        new_response = self.client.get(url)
+        self.assertContains(new_response, '<picture')
+        self.assertNotEqual(new_response['ETag'], response['ETag'])
+        self.client.force_login(seller)
+        self.assertContains(self.client.get(url), '<picture')
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.sellers = [AdvUser.objects.create_user(f'seller{i}', f'seller{i}@example.com', 'password')
+                        for i in range(2)]
+        super_category = SuperCategory.objects.create(name='Электроника', order=1)
+        self.categories = [
+            SubCategory.objects.create(name=f'Раздел {i}', order=i + 2, super_category=super_category)
+            for i in range(2)
+        ]
+        self.products = [
+            Product.objects.create(
+                category=self.categories[0], title=f'Товар {i}', content='Описание', price=i, seller=self.sellers[0],
+            )
+            for i in range(2)
+        ]
+        self.comment = Comment.objects.create(product=self.products[0], author='Гость', content='Комментарий')
+
+    def assertCounters(self, categories, products, sellers):
+        for obj in (*self.categories, *self.products):
+            obj.refresh_from_db()
+        self.assertEqual([category.product_count for category in self.categories], categories)
+        self.assertEqual([product.comment_count for product in self.products], products)
+        self.assertEqual([
+            (stats.active_products, stats.inactive_products, stats.comment_count)
+            for stats in SellerStats.objects.filter(seller__in=self.sellers).order_by('seller')
+        ], sellers)
+        self.assertFalse(any(reconcile_counters().values()))
+
+    def test_product_changes(self):
+        self.assertCounters([2, 0], [1, 0], [(2, 0, 1), (0, 0, 0)])
+        product = self.products[0]
+        product.is_active = False
+        product.save()
+        self.assertCounters([1, 0], [1, 0], [(1, 1, 1), (0, 0, 0)])
+        product.is_active = True
+        product.category = self.categories[1]
+        product.save()
+        self.assertCounters([1, 1], [1, 0], [(2, 0, 1), (0, 0, 0)])
+        # Товар передается другому продавцу вместе с комментариями
+        product.seller = self.sellers[1]
+        product.save()
+        self.assertCounters([1, 1], [1, 0], [(1, 0, 0), (1, 0, 1)])
+        product.delete()
+        self.products.remove(product)
+        self.assertCounters([1, 0], [0], [(1, 0, 0), (0, 0, 0)])
+
+    def test_comment_changes(self):
+        self.comment.is_active = False
+        self.comment.save()
+        self.assertCounters([2, 0], [0, 0], [(2, 0, 0), (0, 0, 0)])
+        self.comment.is_active = True
+        self.comment.product = self.products[1]
+        self.comment.save()
+        self.assertCounters([2, 0], [0, 1], [(2, 0, 1), (0, 0, 0)])
+        self.comment.delete()
+        self.assertCounters([2, 0], [0, 0], [(2, 0, 0), (0, 0, 0)])
+
+    def test_update_counters_never_negative(self):
+        update_counters(Product.objects.filter(pk=self.products[1].pk), {'comment_count': -1})
+        self.assertCounters([2, 0], [1, 0], [(2, 0, 1), (0, 0, 0)])
+
+
+class DeletionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.seller = AdvUser.objects.create_user('seller', 'seller@example.com', 'password')
+        super_category = SuperCategory.objects.create(name='Электроника', order=1)
+        self.category = SubCategory.objects.create(name='Телефоны', order=2, super_category=super_category)
+        self.products = [
+            Product.objects.create(
+                category=self.category, title=f'Товар {i}', content='Описание', price=i, seller=self.seller,
+                is_active=i != 1, image=ContentFile(b'image', 'photo.jpg') if i == 0 else '',
+            )
+            for i in range(3)
+        ]
+        for i in range(2):
+            AdditionalImage.objects.create(product=self.products[0], image=ContentFile(b'image %d' % i, 'photo.jpg'))
+            Comment.objects.create(product=self.products[i], author='Гость', content='Комментарий')
+
+    def test_delete_products(self):
+        # Число запросов не зависит от числа товаров, комментариев и изображений
+        with self.assertNumQueries(15):
+            counts = delete_products(Product.objects.filter(pk__in=[self.products[0].pk, self.products[1].pk]))
+        self.assertEqual(counts, {'files': 3, 'additional_images': 2, 'comments': 2, 'products': 2})
+        self.assertEqual(list(Product.objects.all()), [self.products[2]])
+        self.assertFalse(Comment.objects.exists() or AdditionalImage.objects.exists())
+        self.assertEqual(DeletedFile.objects.filter(field='main.AdditionalImage.image').count(), 2)
+        self.assertEqual(list(DeletedFile.objects.filter(field='main.Product.image').values_list('name', flat=True)),
+                         [self.products[0].image.name])
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.product_count, 1)
+        stats = SellerStats.objects.get(seller=self.seller)
+        self.assertEqual((stats.active_products, stats.inactive_products, stats.comment_count), (1, 0, 0))
+        self.assertFalse(any(reconcile_counters().values()))
+
+    def test_delete_user(self):
+        counts = delete_user(self.seller)
+        self.assertEqual((counts['products'], counts['users']), (3, 1))
+        self.assertFalse(AdvUser.objects.exists() or Product.objects.exists())
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.product_count, 0)
+
+
+class ContentStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        seller = AdvUser.objects.create_user('seller', 'seller@example.com', 'password')
+        super_category = SuperCategory.objects.create(name='Электроника', order=1)
+        category = SubCategory.objects.create(name='Телефоны', order=2, super_category=super_category)
+        self.products = [
+            Product.objects.create(
+                category=category, title=f'Телефон {i}', content='Описание', price=1, seller=seller,
+                image=ContentFile(b'image', f'photo{i}.jpg'),
+            )
+            for i in range(2)
+        ]
+        self.name = self.products[0].image.name
+
+    def make_old(self):
+        past = os.path.getmtime(content_storage.path(self.name)) - 3600
+        os.utime(content_storage.path(self.name), (past, past))
+
+    def test_same_content_saved_once(self):
+        self.assertEqual(self.products[1].image.name, self.name)
+        self.assertEqual(len(os.listdir(os.path.dirname(content_storage.path(self.name)))), 1)
+
+    def test_shared_file_kept(self):
+        self.make_old()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].delete()
+        self.assertTrue(content_storage.exists(self.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].delete()
+        self.assertFalse(content_storage.exists(self.name))
+
+    def test_recent_file_kept_in_queue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_products(Product.objects.all())
+        self.assertEqual(DeletedFile.objects.count(), 2)
+        # Файл только что загружен: ссылающаяся на него запись может быть еще не зафиксирована
+        self.assertEqual(cleanup_files(), 0)
+        self.assertTrue(content_storage.exists(self.name))
+        self.make_old()
+        self.assertEqual(cleanup_files(), 2)
+        self.assertFalse(content_storage.exists(self.name))
+        self.assertFalse(DeletedFile.objects.exists())
+
+    def test_reupload_postpones_deletion(self):
+        self.make_old()
+        Product.objects.filter(pk__in=[product.pk for product in self.products]).update(image='')
+        content_storage.save('photo.jpg', ContentFile(b'image'))
+        self.assertFalse(content_storage.try_delete(self.name))
+        self.assertTrue(content_storage.exists(self.name))
+
+
+class ImportProductsTests(TestCase):
+    def test_invalid_rows_skipped(self):
+        AdvUser.objects.create_user('seller', 'seller@example.com', 'password')
+        super_category = SuperCategory.objects.create(name='Электроника', order=1)
+        SubCategory.objects.create(name='Телефоны', order=2, super_category=super_category)
+        rows = [
+            '{"title": "Телефон", "category": "Телефоны", "seller": "seller", "price": "10.5"}',
+            '{"category": "Телефоны", "seller": "seller", "price": "1"}',
+            '{"title": "Телефон", "category": "Телефоны", "seller": "seller", "price": "дорого"}',
+            '{"title": "%s", "category": "Телефоны", "seller": "seller"}' % ('Т' * 41),
+            '{"title": ',
+            '{"title": "Телефон", "category": "Планшеты", "seller": "seller"}',
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as file:
+            file.write('\n'.join(rows))
+        self.addCleanup(os.remove, file.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_products', file.name, '--batch-size', '2', stdout=stdout, stderr=stderr)
+        self.assertIn('Загружено товаров: 1, пропущено: 5', stdout.getvalue())
+        self.assertEqual(len(stderr.getvalue().splitlines()), 5)
+        self.assertEqual(Product.objects.get().price, 10.5)
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = AdvUser.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.super_category = SuperCategory.objects.create(name='Электроника', order=1)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_products(self, start, count):
+        for i in range(start, start + count):
+            category = SubCategory.objects.create(name=f'Раздел {i}', order=i + 2, super_category=self.super_category)
+            seller = AdvUser.objects.create_user(f'seller{i}', f'seller{i}@example.com', 'password')
+            product = Product.objects.create(
+                category=category, title=f'Товар {i}', content='Описание', price=i,
+                manufacturer='Производитель', seller=seller,
+            )
+            Comment.objects.create(product=product, author='Гость', content='Комментарий')
+
+    def test_changelists_load_related_in_bulk(self):
+        urls = [reverse(f'admin:main_{model}_changelist') for model in ('product', 'comment', 'subcategory')]
+        self.add_products(0, 2)
+        counts = []
+        for url in urls:
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            counts.append(len(queries))
+        self.add_products(2, 5)
+        for url, count in zip(urls, counts):
+            with self.assertNumQueries(count):
+                self.client.get(url)
+
+    def test_send_activation_notifications(self):
+        AdvUser.objects.bulk_create(
+            AdvUser(username=f'user{i}', email=f'user{i}@example.com', is_activated=False) for i in range(3)
+        )
+        AdvUser.objects.create_user('active', 'active@example.com', 'password')
+        response = self.client.post(reverse('admin:main_advuser_changelist'), {
+            'action': 'send_activation_notifications',
+            '_selected_action': list(AdvUser.objects.values_list('pk', flat=True)),
+        }, follow=True)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 3)
+        self.assertContains(response, 'Писем для активации: 3, отправлено: 3')
+
+
+class OutboxTests(TestCase):
+    def test_pending_email_deduplicated(self):
+        enqueue_email('user@example.com', 'Тема', 'Текст', 'key')
+        enqueue_email('user@example.com', 'Тема', 'Текст', 'key')
+        self.assertEqual(deliver_pending(), (1, 1))
+        self.assertEqual(len(mail.outbox), 1)
+        # Ключ отправленного письма можно использовать снова
+        enqueue_email('user@example.com', 'Тема', 'Текст', 'key')
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING).count(), 1)
+
+    def test_claimed_email_leased(self):
+        enqueue_email('user@example.com', 'Тема', 'Текст', 'key')
+        self.assertEqual(len(claim_batch(10)), 1)
+        self.assertEqual(claim_batch(10), [])
+        later = timezone.now() + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE + 1)
+        with mock.patch('main.outbox.timezone.now', return_value=later):
+            self.assertEqual(len(claim_batch(10)), 1)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_email_retried(self):
+        enqueue_email('user@example.com', 'Тема', 'Текст', 'key')
+        with mock.patch('main.outbox.EmailMessage.send', side_effect=OSError('нет связи')):
+            self.assertEqual(deliver_pending(), (1, 0))
+            email = OutgoingEmail.objects.get()
+            self.assertEqual((email.status, email.attempts), (OutgoingEmail.PENDING, 1))
+            self.assertGreater(email.next_attempt_at, timezone.now() + retry_delay(1) - timedelta(seconds=5))
+            self.assertEqual(deliver_pending(), (0, 0))
+            later = email.next_attempt_at + timedelta(seconds=1)
+            with mock.patch('main.outbox.timezone.now', return_value=later):
+                self.assertEqual(deliver_pending(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.FAILED, 2))
+        self.assertIn('нет связи', email.last_error)
+
+    def test_retry_delay(self):
+        self.assertEqual(retry_delay(2), 2 * retry_delay(1))
+        self.assertEqual(retry_delay(100), timedelta(seconds=settings.EMAIL_OUTBOX_MAX_RETRY_DELAY))
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+
+    def test_sustained_load(self):
+        """Запрос в секунду при ограничении 5/m: 5 запросов ведра и по одному каждые 12 секунд"""
+        bucket = TokenBucket('test', '5/m')
+        start = 1_000_000.0
+        allowed = 0
+        for second in range(600):
+            now = start + second
+            # Срок хранения записей LocMemCache отсчитывается по time.time
+            with mock.patch('time.time', return_value=now), mock.patch('time.time_ns', return_value=int(now * 1e9)):
+                if bucket.consume('client') is None:
+                    allowed += 1
+        self.assertIn(allowed, range(54, 57))
+
+
+class ReplicaRoutingTests(TestCase):
+    """Данные, кэшируемые под версией или отдаваемые с ETag, читаются из основной БД"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = AdvUser.objects.create_user('seller', 'seller@example.com', 'password')
+        super_category = SuperCategory.objects.create(name='Электроника', order=1)
+        cls.category = SubCategory.objects.create(name='Телефоны', order=2, super_category=super_category)
+        Product.objects.create(category=cls.category, title='Телефон', content='Описание', price=1, seller=cls.seller)
+
+    def setUp(self):
+        cache.clear()
+        self.reads = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            self.reads.append((model._meta.concrete_model, db_for_read(router, model, **hints)))
+            # Реплики в тестах нет, запросы выполняются в основной БД
+            return None
+        for patcher in (
+            mock.patch('main.routers.replica_enabled', return_value=True),
+            mock.patch('main.middlewares.replica_enabled', return_value=True),
+            mock.patch.object(ReplicaRouter, 'db_for_read', spy),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def replica_reads(self):
+        return [model for model, db in self.reads if db == 'replica']
+
+    def test_category_tree(self):
+        category_tree._loaded = (None, ())
+        with read_from_replica():
+            self.assertEqual(len(category_tree.get()), 1)
+        self.assertEqual(self.replica_reads(), [])
+
+    @override_settings(REPLICA_READ_VIEWS=('main:by_category', 'api_products'))
+    def test_conditional_response(self):
+        self.assertIn('ETag', self.client.get(reverse('api_products')))
+        self.assertEqual(self.replica_reads(), [])
+        url = reverse('main:by_category', kwargs={'pk': self.category.pk})
+        self.client.force_login(self.seller)
+        self.client.get(url)
+        self.assertIn(Product, self.replica_reads())
+
+    def test_catalog_models_only(self):
+        with read_from_replica():
+            list(AdvUser.objects.all())
+            list(Product.objects.all())
+        with read_from_replica(False):
+            list(Product.objects.all())
+        self.assertEqual(self.replica_reads(), [Product])
+
+    def test_sticky_after_write(self):
+        caches['throttle'].clear()
+        self.client.force_login(self.seller)
+        url = reverse('main:by_category', kwargs={'pk': self.category.pk})
+        self.client.get(url)
+        self.assertIn(Product, self.replica_reads())
+        product = Product.objects.get()
+        response = self.client.post(
+            reverse('main:detail', kwargs={'category_pk': self.category.pk, 'pk': product.pk}),
+            {'product': product.pk, 'author': 'seller', 'content': 'Текст'},
+        )
+        self.assertEqual(response.cookies['replica_pin']['max-age'], settings.REPLICA_STICKY_SECONDS)
+        # Пока cookie действует, свои изменения читаются из основной БД
+        self.reads.clear()
+        self.client.get(url)
+        self.assertEqual(self.replica_reads(), [])
@@ -0,0 +1,103 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+class TokenBucket:
+    """Ведро токенов в варианте GCRA: в кэше хранится одно число - время, когда ведро снова станет полным.
+
+    Ограничение 'N/период' означает ведро емкостью N токенов, в которое
+    каждые период/N добавляется один токен. Запрос, пришедший в пустое
+    ведро, отклоняется. Время сдвигается атомарным cache.incr, поэтому
+    одновременные запросы не теряют списанные токены.
+    """
+    def __init__(self, scope, rate, cache_alias='throttle'):
+        self.scope = scope
+        count, period = rate.split('/')
+        self.capacity = int(count)
+        self.period = PERIODS[period[0]] * 1000
+        self.interval = self.period // self.capacity
+        self.cache = caches[cache_alias]
+
+    def consume(self, ident, tokens=1):
+        """Списание токенов, возвращает None, если запрос разрешен, иначе время ожидания в секундах"""
+        key = f'throttle:{self.scope}:{ident}'
+        timeout = self.period // 1000 + 1
+        now = time.time_ns() // 1_000_000
+        cost = self.interval * tokens
+        self.cache.add(key, now, timeout)
+        try:
+            filled_at = self.cache.incr(key, cost)
+        except ValueError:
+            # Запись истекла между add и incr: ведро полное
+            filled_at = now + cost
+            self.cache.set(key, filled_at, timeout)
+        else:
+            if filled_at - cost < now:
+                # Ведро успело наполниться, отсчет начинается заново
+                filled_at = now + cost
+                self.cache.set(key, filled_at, timeout)
+            else:
+                # incr не продлевает срок хранения, а запись не должна истечь раньше,
+                # чем ведро наполнится: время наполнения не превышает now + period
+                self.cache.touch(key, timeout)
+        if filled_at - now > self.period:
+            self.cache.decr(key, cost)
+            return (filled_at - self.period - now) / 1000
+        return None
+
+
+def get_bucket(scope):
+    """Ведро для ограничения из settings.THROTTLE_RATES, None, если ограничение не задано"""
+    rate = settings.THROTTLE_RATES.get(scope)
+    return TokenBucket(scope, rate) if rate else None
+
+
+def get_capacity(scope):
+    """Емкость ведра ограничения scope - наибольшее число токенов за один запрос, None - без ограничения"""
+    bucket = get_bucket(scope)
+    return bucket.capacity if bucket is not None else None
+
+
+def get_client_ip(request):
+    """IP-адрес клиента, за прокси-сервером REMOTE_ADDR должен устанавливать сам прокси-сервер"""
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def consume(scope, ident, tokens=1):
+    """Списание токенов из ведра ident ограничения scope, возвращает None или время ожидания"""
+    bucket = get_bucket(scope)
+    return bucket.consume(ident, tokens) if bucket is not None else None
+
+
+def throttled_response(wait):
+    response = HttpResponse('Слишком много запросов, повторите позже', status=429,
+                            content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = max(1, round(wait))
+    return response
+
+
+def throttle(scope, methods=('POST',)):
+    """Ограничение частоты запросов контроллера по IP-адресу и пользователю.
+
+    Сначала проверяется ведро IP-адреса клиента (без обращения к сессии и
+    БД), затем, для вошедшего пользователя, ведро пользователя.
+    Отклоненный запрос получает ответ 429 до выполнения контроллера.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                wait = consume(scope, f'ip:{get_client_ip(request)}')
+                if wait is None and request.user.is_authenticated:
+                    wait = consume(scope, f'user:{request.user.pk}')
+                if wait is not None:
+                    return throttled_response(wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,142 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails.signals import saved_file
+
+from .apps import products_bulk_created, thumbnails_generated
+from .models import Product, AdditionalImage
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_FIELDS = ((Product, 'image'), (AdditionalImage, 'image'))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_format_thumbnailer(source, extension=None):
+    """Thumbnailer для изображения; extension задает формат миниатюр вместо THUMBNAIL_EXTENSION"""
+    thumbnailer = get_thumbnailer(source)
+    if extension:
+        thumbnailer.thumbnail_extension = extension
+        thumbnailer.thumbnail_transparency_extension = extension
+    return thumbnailer
+
+
+def get_field_file(label, field_name, name):
+    """Файл поля модели по имени без загрузки записи"""
+    model = apps.get_model(label)
+    field = model._meta.get_field(field_name)
+    return field.attr_class(model(), field, name)
+
+
+def get_image_products(label, field_name, name):
+    """Товары, на странице или в карточке которых выводится файл name поля модели label"""
+    if label == Product._meta.label:
+        return Product.objects.filter(**{field_name: name})
+    return Product.objects.filter(pk__in=AdditionalImage.objects.filter(**{field_name: name}).values('product'))
+
+
+def generate_thumbnails(label, field_name, name):
+    """Создание миниатюр всех псевдонимов THUMBNAIL_ALIASES во всех форматах для одного файла.
+
+    Если созданы новые миниатюры, отправляется сигнал thumbnails_generated с
+    товарами, выводящими файл: кэшированные страницы и фрагменты с исходным
+    изображением вместо миниатюр должны смениться.
+    """
+    fieldfile = get_field_file(label, field_name, name)
+    target = f'{label}.{field_name}'
+    count = 0
+    created = False
+    for extension in (None,) + tuple(settings.THUMBNAIL_SOURCE_FORMATS):
+        thumbnailer = get_format_thumbnailer(fieldfile, extension)
+        for alias, options in aliases.all(target, include_global=True).items():
+            options = dict(options, ALIAS=alias)
+            if thumbnailer.get_existing_thumbnail(options) is None:
+                thumbnailer.get_thumbnail(options)
+                created = True
+            count += 1
+    if created:
+        products = list(get_image_products(label, field_name, name).values_list('pk', 'category_id'))
+        if products:
+            thumbnails_generated.send(sender=apps.get_model(label), products=products)
+    return count
+
+
+def get_executor():
+    """Общий для процесса пул, запускающий обработчики методом spawn с собственными подключениями к БД"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+    return _executor
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error('Ошибка создания миниатюр', exc_info=future.exception())
+
+
+def schedule_thumbnails(label, field_name, name):
+    if not settings.THUMBNAIL_WORKERS:
+        try:
+            generate_thumbnails(label, field_name, name)
+        except Exception:
+            logger.exception('Ошибка создания миниатюр')
+        return
+    get_executor().submit(generate_thumbnails, label, field_name, name).add_done_callback(_log_failure)
+
+
+def _generate_in_thread(label, field_name, name):
+    try:
+        schedule_thumbnails(label, field_name, name)
+    finally:
+        connections.close_all()
+
+
+def schedule_missing_thumbnails(fieldfile):
+    """Фоновое создание миниатюр файла, у которого их не оказалось при выводе страницы.
+
+    Повторно файл ставится в очередь не раньше чем через
+    THUMBNAIL_RETRY_TIMEOUT секунд. Без пула процессов (THUMBNAIL_WORKERS = 0)
+    миниатюры создаются в отдельном потоке, а не при выводе страницы.
+    """
+    model = type(fieldfile.instance)._meta.concrete_model
+    if (model, fieldfile.field.name) not in THUMBNAIL_FIELDS:
+        return
+    if not cache.add(f'thumbnails:scheduled:{fieldfile.name}', True, settings.THUMBNAIL_RETRY_TIMEOUT):
+        return
+    args = (model._meta.label, fieldfile.field.name, fieldfile.name)
+    if settings.THUMBNAIL_WORKERS:
+        schedule_thumbnails(*args)
+    else:
+        threading.Thread(target=_generate_in_thread, args=args, daemon=True).start()
+
+
+def saved_file_dispatcher(sender, fieldfile, **kwargs):
+    if (sender, fieldfile.field.name) in THUMBNAIL_FIELDS:
+        label, field_name, name = sender._meta.label, fieldfile.field.name, fieldfile.name
+        transaction.on_commit(lambda: schedule_thumbnails(label, field_name, name))
+
+
+def products_bulk_created_dispatcher(sender, **kwargs):
+    names = [product.image.name for product in kwargs['products'] if product.image]
+    label = Product._meta.label
+    transaction.on_commit(lambda: [schedule_thumbnails(label, 'image', name) for name in names])
+
+
+saved_file.connect(saved_file_dispatcher)
+products_bulk_created.connect(products_bulk_created_dispatcher)
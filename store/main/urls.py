@@ -2,7 +2,8 @@ from django.urls import path
 
 from .views import index, other_page, detail, StoreLoginView, profile, StoreLogoutView, ChangeInfoUserFormView, \
     UserPasswordChangeView, RegisterUserView, RegisterDoneView, user_activate, DeleteUserView, by_category, \
-    profile_product_detail, profile_product_add, profile_product_change, profile_product_delete
+    profile_product_detail, profile_product_add, profile_product_change, profile_product_delete, request_stats, \
+    comments
 
 app_name = 'main'
 
@@ -17,9 +18,11 @@ urlpatterns = [
     path('accounts/profile/', profile, name='profile'),
     path('accounts/profile/delete', DeleteUserView.as_view(), name='profile_delete'),
     path('accounts/profile/change/', ChangeInfoUserFormView.as_view(), name='profile_change'),
+    path('accounts/stats/', request_stats, name='request_stats'),
     path('accounts/login/', StoreLoginView.as_view(), name='login'),
     path('accounts/logout/', StoreLogoutView.as_view(), name='logout'),
     path('accounts/password/change', UserPasswordChangeView.as_view(), name='password_change'),
+    path('<int:category_pk>/<int:pk>/comments/', comments, name='comments'),
     path('<int:category_pk>/<int:pk>/', detail, name='detail'),
     path('<int:pk>/', by_category, name='by_category'),
     path('<str:page>/', other_page, name='other'),
@@ -9,6 +9,13 @@ signer = Signer()
 
 
 def send_activation_notification(user):
+    from .outbox import enqueue_emails
+    enqueue_emails([get_activation_email(user)])
+
+
+def get_activation_email(user):
+    """Письмо для активации, еще не поставленное в очередь"""
+    from .models import OutgoingEmail
     if ALLOWED_HOSTS:
         host = 'htttp://' + ALLOWED_HOSTS[0]
     else:
@@ -20,14 +27,44 @@ def send_activation_notification(user):
     }
     subject = render_to_string('email/activation_letter_subject.txt', context)
     body_text = render_to_string('email/activation_letter_body.txt', context)
-    user.email_user(subject, body_text)
+    return OutgoingEmail(to=user.email, subject=subject, body=body_text, dedup_key=f'activation:{user.pk}')
+
+
+def get_comments_digest_email(seller, comments):
+    """Одно письмо продавцу обо всех новых комментариях к его товарам, еще не поставленное в очередь"""
+    from .models import OutgoingEmail
+    if ALLOWED_HOSTS:
+        host = 'http://' + ALLOWED_HOSTS[0]
+    else:
+        host = 'http://localhost:8000'
+    context = {
+        'author': seller,
+        'host': host,
+        'comments': comments
+    }
+    subject = render_to_string('email/comments_digest_subject.txt', context).strip()
+    body_text = render_to_string('email/comments_digest_body.txt', context)
+    return OutgoingEmail(to=seller.email, subject=subject, body=body_text,
+                         dedup_key=f'comments:{seller.pk}:{comments[0].pk}')
+
+
+def send_comments_digest(comments):
+    """Постановка в очередь писем о новых комментариях, по одному письму на продавца"""
+    from .models import AdvUser
+    from .outbox import enqueue_emails
+    by_seller = {}
+    for comment in comments:
+        by_seller.setdefault(comment.product.seller_id, []).append(comment)
+    sellers = AdvUser.objects.filter(send_messages=True).in_bulk(list(by_seller))
+    enqueue_emails([get_comments_digest_email(seller, by_seller[pk]) for pk, seller in sellers.items()])
 
 
-def get_timestamp_path(filename):
-    return f'{datetime.now().timestamp()}, {splitext(filename)}'
+def get_timestamp_path(instance, filename):
+    return f'{datetime.now().strftime("%Y%m%d%H%M%S%f")}{splitext(filename)[1].lower()}'
 
 
 def send_new_comment_notification(comment):
+    from .outbox import enqueue_email
     if ALLOWED_HOSTS:
         host = 'http://' + ALLOWED_HOSTS[0]
     else:
@@ -40,6 +77,6 @@ def send_new_comment_notification(comment):
     }
     subject = render_to_string('email/new_comment_letter_subject.txt', context)
     body_text = render_to_string('email/new_comment_letter_body.txt', context)
-    author.email_user(subject, body_text)
+    enqueue_email(author.email, subject, body_text, f'comment:{comment.pk}')
 
 
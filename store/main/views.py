@@ -1,26 +1,47 @@
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView
 from django.contrib.messages.views import SuccessMessageMixin
-from django.core.paginator import Paginator
+from django.core.paginator import Paginator, InvalidPage
 from django.core.signing import BadSignature
-from django.db.models import Q
 from django.db.models.signals import post_save
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.template import TemplateDoesNotExist
 from django.template.loader import get_template
 from django.urls import reverse_lazy
+from django.utils.http import urlencode
 from django.views.generic import UpdateView, CreateView, TemplateView, DeleteView
 
+from .apps import comments_bulk_created
+from .caching import PRODUCTS_VERSION, COMMENTS_VERSION, CATEGORIES_VERSION
+from .conditional import conditional
+from .counters import get_seller_stats
+from .deletion import delete_user, delete_products
+from .facets import FacetSelection, filter_products, get_facets
+from .loaders import load_product_detail, comments_page
 from .forms import ChangeInfoUserForm, RegisterUserForm, SearchForm, ProductForm, AIFormSet, UserCommentForm, \
     GuestCommentForm
+from .instrumentation import registry
 from .models import AdvUser, SubCategory, Product, Comment
-from .utilites import signer, send_new_comment_notification
+from .page_cache import cache_page_for_anonymous, INDEX_TAG, category_tag, product_tag
+from .pagination import KeysetPaginator
+from .search import search_products
+from .throttling import throttle
+from .utilites import signer, send_new_comment_notification, send_comments_digest
 
 
+@staff_member_required
+def request_stats(request):
+    """Накопленная статистика запросов к БД и времени обработки по контроллерам"""
+    return JsonResponse(registry.snapshot(), json_dumps_params={'ensure_ascii': False})
+
+
+@conditional(PRODUCTS_VERSION, COMMENTS_VERSION, CATEGORIES_VERSION, anonymous_only=True)
+@cache_page_for_anonymous(lambda: [INDEX_TAG])
 def index(request):
     products = Product.objects.filter(is_active=True)[:20]
     context = {
@@ -39,9 +60,12 @@ def other_page(request, page):
 
 @login_required
 def profile(request):
-    products = Product.objects.filter(seller=request.user.pk)
+    products = Product.objects.filter(seller=request.user.pk).select_related('category__super_category')
+    page = KeysetPaginator(products, 10).get_page(request.GET.get('cursor'))
     context = {
-        'products': products
+        'stats': get_seller_stats(request.user),
+        'page': page,
+        'products': page.object_list,
     }
     return render(request, 'main/profile.html', context)
 
@@ -113,44 +137,72 @@ class DeleteUserView(LoginRequiredMixin, DeleteView):
 
     def post(self, request, *args, **kwargs):
         logout(request)
-        messages.add_message(request, messages.SUCCESS, 'Пользователь удален')
         return super().post(request, *args, **kwargs)
 
+    def form_valid(self, form):
+        counts = delete_user(self.object)
+        messages.add_message(
+            self.request, messages.SUCCESS,
+            f'Пользователь удален. Удалено товаров: {counts["products"]}, комментариев: {counts["comments"]}'
+        )
+        return redirect(self.get_success_url())
+
     def get_object(self, queryset=None):
         if not queryset:
             queryset = self.get_queryset()
         return get_object_or_404(queryset, pk=self.user_id)
 
 
+@conditional(PRODUCTS_VERSION, COMMENTS_VERSION, CATEGORIES_VERSION, anonymous_only=True)
+@cache_page_for_anonymous(
+    lambda pk: [category_tag(pk)], params=('keyword', 'page', 'cursor', 'manufacturer', 'price')
+)
 def by_category(request, pk):
-    category = get_object_or_404(SubCategory, pk=pk)
+    category = get_object_or_404(SubCategory.objects.select_related('super_category'), pk=pk)
     products = Product.objects.filter(is_active=True, category=pk)
     if 'keyword' in request.GET:
         keyword = request.GET['keyword']
-        q = Q(title__icontains=keyword) | Q(content__icontains=keyword)
-        products = products.filter(q)
+        products = search_products(products, keyword)
     else:
         keyword = ''
-        form = SearchForm(initial={'keyword': keyword})
+    form = SearchForm(initial={'keyword': keyword})
+    selection = FacetSelection.from_params(request.GET)
+    facets = get_facets(products, selection)
+    products = filter_products(products, selection)
+    query_params = selection.get_params()
+    if keyword:
+        query_params.insert(0, ('keyword', keyword))
+    if keyword:
+        # Результаты поиска упорядочены по релевантности, поэтому для них остается постраничный вывод по номерам
         paginator = Paginator(products, 2)
         if 'page' in request.GET:
             page_num = request.GET['page']
         else:
             page_num = 1
         page = paginator.get_page(page_num)
-        context = {
-            'category': category,
-            'page': page,
-            'products': page.object_list,
-            'form': form
-        }
-        return render(request, 'main/by_category.html', context)
+    else:
+        page = KeysetPaginator(products, 2).get_page(request.GET.get('cursor'))
+    context = {
+        'category': category,
+        'page': page,
+        'products': page.object_list,
+        'form': form,
+        'facets': facets,
+        'selection': selection,
+        'query': urlencode(query_params),
+    }
+    return render(request, 'main/by_category.html', context)
 
 
+@throttle('comment')
+# Страница с формой комментария содержит CSRF-токен и не кэшируется, см. cache_page_for_anonymous
+@conditional(PRODUCTS_VERSION, COMMENTS_VERSION, CATEGORIES_VERSION, anonymous_only=True, form=True)
 def detail(request, category_pk, pk):
-    product = get_object_or_404(Product, pk=pk)
-    ais = product.additionalimage_set.all()
-    comments = Comment.objects.filter(product=pk, is_active=True)
+    try:
+        product_detail = load_product_detail(pk, category_pk)
+    except Product.DoesNotExist:
+        raise Http404
+    product = product_detail.product
     initial = {'product': product.pk}
     if request.user.is_authenticated:
         initial['author'] = request.user.username
@@ -163,15 +215,35 @@ def detail(request, category_pk, pk):
         if c_form.is_valid():
             c_form.save()
             messages.add_message(request, messages.SUCCESS, 'Комментарий добавлен')
+            # Первая страница комментариев и их число загружены до сохранения нового комментария
+            product_detail = load_product_detail(pk, category_pk)
+            product = product_detail.product
     context = {
         'product': product,
-        'ais': ais,
-        'comments': comments,
+        'ais': product_detail.images,
+        'comments': product_detail.comments,
         'form': form
     }
     return render(request, 'main/detail.html', context)
 
 
+@conditional(PRODUCTS_VERSION, COMMENTS_VERSION, anonymous_only=True)
+@cache_page_for_anonymous(lambda category_pk, pk: [product_tag(pk)], params=('cursor',))
+def comments(request, category_pk, pk):
+    """Фрагмент страницы товара со следующей страницей комментариев"""
+    if not Product.objects.filter(pk=pk, category=category_pk, is_active=True).exists():
+        raise Http404
+    try:
+        page = comments_page(pk, request.GET.get('cursor'))
+    except InvalidPage:
+        raise Http404
+    context = {
+        'product': Product(pk=pk, category_id=category_pk),
+        'comments': page,
+    }
+    return render(request, 'main/comment_list.html', context)
+
+
 @login_required
 def profile_product_detail(request, pk):
     product = get_object_or_404(Product, pk=pk)
@@ -233,7 +305,7 @@ def profile_product_delete(request, pk):
     """Контроллер для удаления товара"""
     product = get_object_or_404(Product, pk=pk)
     if request.method == 'POST':
-        product.delete()
+        delete_products(Product.objects.filter(pk=product.pk))
         messages.add_message(request, messages.SUCCESS, 'Информация о товаре удалена')
         return redirect('main:profile')
     else:
@@ -249,4 +321,9 @@ def post_save_dispatcher(sender, **kwargs):
         send_new_comment_notification(kwargs['instance'])
 
 
+def comments_bulk_created_dispatcher(sender, **kwargs):
+    send_comments_digest(kwargs['comments'])
+
+
 post_save.connect(post_save_dispatcher, sender=Comment)
+comments_bulk_created.connect(comments_bulk_created_dispatcher)
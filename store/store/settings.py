@@ -53,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.instrumentation.RequestStatsMiddleware',
+    'main.middlewares.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,7 +69,7 @@ ROOT_URLCONF = 'store.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'main.instrumentation.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -88,13 +90,56 @@ WSGI_APPLICATION = 'store.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Профиль SQLite для рабочего сервера: WAL, чтобы читатели не блокировали запись комментариев,
+# отображение файла в память и постоянные соединения
+SQLITE_PRODUCTION = env.bool('SQLITE_PRODUCTION', default=False)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'memory',
+} if SQLITE_PRODUCTION else {}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': env('DATABASE_NAME', default=os.path.join(BASE_DIR, 'db.sqlite3')),
+        'CONN_MAX_AGE': env.int('CONN_MAX_AGE', default=600 if SQLITE_PRODUCTION else 0),
+        'OPTIONS': {
+            # Ожидание снятия блокировки записи, в секундах
+            'timeout': env.int('SQLITE_BUSY_TIMEOUT', default=20),
+        },
     }
 }
 
+# Реплика для чтения данных каталога; для разработки подойдет копия основной БД,
+# обновляемая командой sync_replica. В тестах реплика указывает на основную БД.
+REPLICA_DATABASE = 'replica'
+if env('REPLICA_DATABASE_NAME', default=''):
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES['default'],
+        'NAME': env('REPLICA_DATABASE_NAME'),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['main.routers.ReplicaRouter']
+REPLICA_MODELS = ('main.Category', 'main.Product', 'main.AdditionalImage', 'main.Comment')
+# Ответы контроллеров API снабжаются ETag по версиям данных и всегда строятся по основной БД
+# (см. main.conditional), поэтому с реплики читают только страницы для вошедших пользователей
+REPLICA_READ_VIEWS = (
+    'main:index', 'main:by_category', 'main:detail', 'main:comments',
+)
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=10)
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    # Ведра токенов ограничения частоты запросов хранятся в памяти процесса
+    'throttle': env.cache('THROTTLE_CACHE_URL', default='locmemcache://throttle'),
+}
+PAGE_CACHE_TIMEOUT = env.int('PAGE_CACHE_TIMEOUT', default=300)
+# Срок хранения фрагментов шаблонов (карточек товаров, навигации), 0 - фрагменты не кэшируются
+FRAGMENT_CACHE_TIMEOUT = env.int('FRAGMENT_CACHE_TIMEOUT', default=3600)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -141,8 +186,19 @@ AUTH_USER_MODEL = 'main.AdvUser'
 
 EMAIL_PORT = 1025
 
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60
+EMAIL_OUTBOX_MAX_RETRY_DELAY = 3600
+EMAIL_OUTBOX_LEASE = 300
+
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+# Отдача медиафайлов: '' - средствами Django, 'nginx' - через X-Accel-Redirect, 'sendfile' - через X-Sendfile
+MEDIA_OFFLOAD = env('MEDIA_OFFLOAD', default='')
+# Внутренний location nginx, соответствующий MEDIA_ROOT
+MEDIA_ACCEL_LOCATION = env('MEDIA_ACCEL_LOCATION', default='/protected-media/')
+# Срок кэширования медиафайлов, имена которых не определяются содержимым
+MEDIA_MAX_AGE = env.int('MEDIA_MAX_AGE', default=3600)
 
 
 THUMBNAIL_ALIASES = {
@@ -151,23 +207,76 @@ THUMBNAIL_ALIASES = {
             'size': (96, 96),
             'crop': 'scale',
         },
+        'default_2x': {
+            'size': (192, 192),
+            'crop': 'scale',
+        },
     },
 }
 
 THUMBNAIL_BASEDIR = 'thumbnails'
 
+THUMBNAIL_SRCSET = {
+    'default': {'1x': 'default', '2x': 'default_2x'},
+}
+THUMBNAIL_SOURCE_FORMATS = ('webp',)
+# Файлы content_storage, записанные или повторно загруженные за это время, не удаляются:
+# ссылающаяся на них запись может быть еще не зафиксирована
+CONTENT_STORAGE_GRACE_SECONDS = env.int('CONTENT_STORAGE_GRACE_SECONDS', default=300)
+THUMBNAIL_WORKERS = env.int('THUMBNAIL_WORKERS', default=2)
+# Через сколько секунд снова ставить в очередь файл, миниатюры которого не нашлись при выводе страницы
+THUMBNAIL_RETRY_TIMEOUT = env.int('THUMBNAIL_RETRY_TIMEOUT', default=60)
+
+QUERY_BUDGETS = {
+    'main:index': 1,
+    'main:by_category': 3,
+    'main:detail': 4,
+}
+
+SEARCH_BACKEND = env('SEARCH_BACKEND', default='main.search.SQLiteFTSBackend')
+
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_URLS_REGEX = r'^/api/.*$'
 
+# Вывод товаров и комментариев в API через .values() без создания экземпляров моделей
+API_FAST_SERIALIZATION = env.bool('API_FAST_SERIALIZATION', default=False)
+# Асинхронные контроллеры товаров и комментариев в API, имеют смысл только при развертывании через ASGI
+API_ASYNC_VIEWS = env.bool('API_ASYNC_VIEWS', default=False)
+
+# Кэш в памяти процесса (CACHE_URL по умолчанию) не виден другим процессам: сброс записей
+# аутентификации при смене пароля, деактивации и отзыве токена до них не дойдет
+CACHE_IS_SHARED = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+# Срок хранения в кэше пользователей и токенов API, 0 - не кэшируются
+AUTH_CACHE_TIMEOUT = env.int('AUTH_CACHE_TIMEOUT', default=300 if CACHE_IS_SHARED else 0)
+# Срок, в течение которого проверенные имя и пароль базовой аутентификации не проверяются повторно
+AUTH_BASIC_CACHE_TIMEOUT = env.int('AUTH_BASIC_CACHE_TIMEOUT', default=60 if CACHE_IS_SHARED else 0)
+
+# Ограничение частоты запросов 'число/период' (s, m, h, d), пустая строка - без ограничения:
+# comment - добавление комментариев с одного IP-адреса и одним пользователем,
+# guest и user - запросы к API гостей по IP-адресу и вошедших пользователей
+THROTTLE_RATES = {
+    'comment': env('THROTTLE_COMMENT_RATE', default='5/m'),
+    'guest': env('THROTTLE_GUEST_RATE', default='120/m'),
+    'user': env('THROTTLE_USER_RATE', default='600/m'),
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 2,
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer' if API_FAST_SERIALIZATION else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+        'api.authentication.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.GuestThrottle',
+        'api.throttling.UserThrottle',
     ),
 }
 